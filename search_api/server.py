@@ -0,0 +1,282 @@
+import asyncio
+import base64
+import binascii
+import functools
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from aiohttp import web
+
+# The search backends are shared with the Streamlit UI.
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "streamlit_app")
+)
+
+import search  # noqa: E402
+from cache import SearchKey, to_prometheus  # noqa: E402
+from paging import Cursor  # noqa: E402
+
+__all__ = (
+    "make_app",
+    "main",
+)
+
+SEARCH_API_HOST = os.environ.get("SEARCH_API_HOST", "0.0.0.0")
+SEARCH_API_PORT = int(os.environ.get("SEARCH_API_PORT", 8080))
+# Threads running blocking backend calls, i.e. concurrent cache misses.
+SEARCH_API_WORKERS = int(os.environ.get("SEARCH_API_WORKERS", 32))
+# Largest page a client may ask for.
+MAX_PAGE_SIZE = 1000
+
+DEFAULT_START = datetime(2020, 4, 1)
+DEFAULT_END = datetime(2020, 4, 30, 23, 59)
+DEFAULT_SORT = "Most Recent"
+SEARCH_KINDS = {"hashtag": "Hashtag", "text": "Tweets"}
+
+_dumps = functools.partial(json.dumps, default=str)
+
+
+def _json(data, status=200):
+    return web.json_response(data, status=status, dumps=_dumps)
+
+
+def _records(df):
+    """Rows of a DataFrame as JSON-ready dicts, NaN as null."""
+    if df.empty:
+        return []
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+def encode_cursor(cursor):
+    """Opaque page token of a `Cursor`, None stays None."""
+    if cursor is None:
+        return None
+    raw = _dumps([cursor.value, cursor.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """`Cursor` of a page token from `encode_cursor`."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        value, _id = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        raise web.HTTPBadRequest(text="invalid cursor")
+    return Cursor(value, _id)
+
+
+def _datetime(request, name, default):
+    value = request.query.get(name)
+    if not value:
+        return default
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise web.HTTPBadRequest(text=f"{name} must be an ISO 8601 datetime")
+
+
+def _ids(request, name):
+    try:
+        ids = [int(value) for value in request.query.getall(name, [])]
+    except ValueError:
+        raise web.HTTPBadRequest(text=f"{name} must be integers")
+    if not ids:
+        raise web.HTTPBadRequest(text=f"{name} is required")
+    # Keep the order, drop duplicates.
+    return list(dict.fromkeys(ids))
+
+
+async def _run(request, func, *args):
+    """Run a blocking backend call on the worker threads."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        request.app["executor"], functools.partial(func, *args)
+    )
+
+
+async def health(request):
+    return _json({"status": "ok", "indexes_ready": search.indexes_ready.is_set()})
+
+
+def _find_user(username):
+    key = SearchKey.make("Username", username)
+    (user, tweets), elapsed_time = search.check_cache(
+        key, lambda: search.load_user(key.term), not_found=(None, None)
+    )
+    return user, tweets, elapsed_time
+
+
+async def user(request):
+    try:
+        user, tweets, elapsed_time = await _run(
+            request, _find_user, request.match_info["username"]
+        )
+    except Exception as e:
+        print("Error during database query: " + str(e))
+        raise web.HTTPServiceUnavailable(text="user backend unavailable")
+    if user is None:
+        raise web.HTTPNotFound(text="user not found")
+    return _json({"user": user, "tweets": _records(tweets), "elapsed": elapsed_time})
+
+
+async def search_tweets(request):
+    kind = SEARCH_KINDS.get(request.match_info["kind"])
+    if kind is None:
+        raise web.HTTPNotFound(text="unknown search type")
+    term = request.query.get("q", "").strip()
+    if not term:
+        raise web.HTTPBadRequest(text="q is required")
+    sort = request.query.get("sort", DEFAULT_SORT)
+    if sort not in search.sort_options:
+        raise web.HTTPBadRequest(
+            text=f"sort must be one of {', '.join(search.sort_options)}"
+        )
+    try:
+        size = int(request.query.get("size", 20))
+    except ValueError:
+        raise web.HTTPBadRequest(text="size must be an integer")
+    if not 1 <= size <= MAX_PAGE_SIZE:
+        raise web.HTTPBadRequest(text=f"size must be between 1 and {MAX_PAGE_SIZE}")
+    direction = request.query.get("direction", "next")
+    if direction not in ("next", "prev"):
+        raise web.HTTPBadRequest(text="direction must be next or prev")
+
+    key = SearchKey.make(
+        kind,
+        term,
+        _datetime(request, "start", DEFAULT_START),
+        _datetime(request, "end", DEFAULT_END),
+        sort,
+    )
+    cursor = decode_cursor(request.query.get("cursor"))
+    try:
+        page, total, exact, elapsed_time = await _run(
+            request, search.find_page, key, size, cursor, direction == "prev"
+        )
+    except Exception as e:
+        print("Error during database query: " + str(e))
+        raise web.HTTPServiceUnavailable(text="search backend unavailable")
+    return _json(
+        {
+            "rows": _records(page.rows),
+            "total": total,
+            "exact": exact,
+            "next": encode_cursor(page.next),
+            "prev": encode_cursor(page.prev),
+            "elapsed": elapsed_time,
+        }
+    )
+
+
+def _timelines(user_ids):
+    return search.check_cache_many(
+        {user_id: "show_more" + str(user_id) for user_id in user_ids},
+        lambda missing: search.get_tweets_by_users(
+            missing, search.bucket_name, search.scope_name, search.collection_name
+        ),
+    )
+
+
+async def timelines(request):
+    results, elapsed_time = await _run(request, _timelines, _ids(request, "user_id"))
+    return _json(
+        {
+            "timelines": {str(k): _records(df) for k, df in results.items()},
+            "elapsed": elapsed_time,
+        }
+    )
+
+
+def _retweets(tweet_ids):
+    return search.check_cache_many(
+        {tweet_id: "retweet" + str(tweet_id) for tweet_id in tweet_ids},
+        lambda missing: search.get_retweets_by_tweets(
+            missing, search.inventory_scope
+        ),
+    )
+
+
+async def retweets(request):
+    results, elapsed_time = await _run(request, _retweets, _ids(request, "tweet_id"))
+    return _json(
+        {
+            "retweets": {str(k): _records(df) for k, df in results.items()},
+            "elapsed": elapsed_time,
+        }
+    )
+
+
+async def dashboard(request):
+    dashboard = await _run(request, search.get_dashboard_metrics)
+    name = request.match_info.get("name")
+    if name is None:
+        # Metrics not computed yet are null.
+        return _json(
+            {key: None if df is None else _records(df) for key, df in dashboard.items()}
+        )
+    if name not in dashboard:
+        raise web.HTTPNotFound(text="unknown metric")
+    if dashboard[name] is None:
+        raise web.HTTPServiceUnavailable(text="metric not computed yet")
+    return _json(_records(dashboard[name]))
+
+
+async def metrics(request):
+    """Cache statistics in the Prometheus text format."""
+    caches = {
+        "search": search.inmemory_cache,
+        "search_l1": search.inmemory_cache.l1,
+        "search_l2": search.inmemory_cache.l2,
+        "dashboard": search.redis_cache,
+    }
+    return web.Response(
+        text=to_prometheus(caches), content_type="text/plain", charset="utf-8"
+    )
+
+
+async def _start_workers(app):
+    app["executor"] = ThreadPoolExecutor(
+        SEARCH_API_WORKERS, thread_name_prefix="search-api"
+    )
+    yield
+    app["executor"].shutdown(wait=False)
+
+
+def make_app():
+    """Search service over the backends and caches of `search`.
+
+    Backend calls block, they run on a pool of threads while the
+    event loop keeps accepting requests. Connections and caches
+    are opened once, when `search` is imported.
+
+    Returns:
+        web.Application: The application, e.g. for `web.run_app`.
+    """
+    app = web.Application()
+    app.cleanup_ctx.append(_start_workers)
+    app.add_routes(
+        [
+            web.get("/health", health),
+            web.get("/users/{username}", user),
+            web.get("/search/{kind}", search_tweets),
+            web.get("/timelines", timelines),
+            web.get("/retweets", retweets),
+            web.get("/dashboard", dashboard),
+            web.get("/dashboard/{name}", dashboard),
+            web.get("/metrics", metrics),
+        ]
+    )
+    return app
+
+
+def main():
+    web.run_app(make_app(), host=SEARCH_API_HOST, port=SEARCH_API_PORT)
+
+
+if __name__ == "__main__":
+    main()
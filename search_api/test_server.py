@@ -0,0 +1,168 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import types
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("aiohttp")
+fakeredis = pytest.importorskip("fakeredis")
+
+from aiohttp.test_utils import TestClient, TestServer  # noqa: E402
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "streamlit_app")
+)
+
+from cache import NEGATIVE, RedisCache, TieredCache, TTLCache  # noqa: E402
+from paging import page_frame  # noqa: E402
+
+TWEETS = pd.DataFrame(
+    {
+        "id": range(10),
+        "created_at": [f"2020-04-{i + 1:02d} 10:00:00+00:00" for i in range(10)],
+        "text": [f"tweet {i}" for i in range(10)],
+    }
+)
+
+
+def fake_search():
+    """Stand-in for `search`, which connects to the backends on import."""
+    search = types.ModuleType("search")
+    search.indexes_ready = threading.Event()
+    search.sort_options = {"Most Recent": "created_at"}
+    search.bucket_name = search.scope_name = search.collection_name = "tweets"
+    search.inventory_scope = None
+    search.redis_cache = RedisCache()
+    search.redis_cache.redis = fakeredis.FakeStrictRedis()
+    search.inmemory_cache = TieredCache(TTLCache(None, 60), search.redis_cache)
+
+    def found(value, not_found=None):
+        if value is NEGATIVE:
+            return pd.DataFrame() if not_found is None else not_found
+        return value
+
+    def check_cache(key, loader, not_found=None):
+        return found(loader(), not_found), 0.0
+
+    def check_cache_many(queries, loader):
+        results = loader(list(queries))
+        return {_id: found(results[_id]) for _id in queries}, 0.0
+
+    def find_page(key, size, cursor, backward):
+        if key.term == "down":
+            raise ConnectionError("backend unavailable")
+        page = page_frame(TWEETS, "created_at", True, size, cursor, backward)
+        return page, len(TWEETS), True, 0.0
+
+    def load_user(name):
+        if name == "down":
+            raise ConnectionError("backend unavailable")
+        if name == "nobody":
+            return NEGATIVE
+        return {"ID": 1, "Name": name}, TWEETS.head(2)
+
+    search.check_cache = check_cache
+    search.check_cache_many = check_cache_many
+    search.find_page = find_page
+    search.load_user = load_user
+    search.get_tweets_by_users = lambda ids, *names: {i: TWEETS.head(i) for i in ids}
+    search.get_retweets_by_tweets = lambda ids, scope: dict.fromkeys(ids, NEGATIVE)
+    search.get_dashboard_metrics = lambda: {
+        "top_users": TWEETS.head(1),
+        "top_tweets": None,
+    }
+    return search
+
+
+@pytest.fixture(scope="module")
+def server():
+    sys.modules["search"] = fake_search()
+    try:
+        import server
+    finally:
+        del sys.modules["search"]
+    return server
+
+
+@pytest.fixture
+def get(server):
+    def get(*urls):
+        async def fetch():
+            async with TestClient(TestServer(server.make_app())) as client:
+                responses = []
+                for url in urls:
+                    response = await client.get(url)
+                    body = await response.text()
+                    responses.append((response.status, body))
+                return responses
+
+        return asyncio.run(fetch())
+
+    return get
+
+
+def test_search_pages_with_cursors(get):
+    [(status, body)] = get("/search/hashtag?q=covid&size=3")
+    assert status == 200
+    first = json.loads(body)
+    assert [row["id"] for row in first["rows"]] == [9, 8, 7]
+    assert first["total"] == 10 and first["prev"] is None
+
+    [(_, body)] = get(f"/search/hashtag?q=covid&size=3&cursor={first['next']}")
+    second = json.loads(body)
+    assert [row["id"] for row in second["rows"]] == [6, 5, 4]
+    [(_, body)] = get(
+        f"/search/hashtag?q=covid&size=3&direction=prev&cursor={second['prev']}"
+    )
+    assert [row["id"] for row in json.loads(body)["rows"]] == [9, 8, 7]
+
+
+@pytest.mark.parametrize(
+    "url, status",
+    [
+        ("/search/text?q=", 400),
+        ("/search/text?q=a&size=0", 400),
+        ("/search/text?q=a&sort=Random", 400),
+        ("/search/text?q=a&cursor=@@", 400),
+        ("/search/text?q=a&start=yesterday", 400),
+        ("/search/users?q=a", 404),
+        ("/search/text?q=down", 503),
+        ("/timelines", 400),
+        ("/timelines?user_id=x", 400),
+        ("/users/nobody", 404),
+        ("/users/down", 503),
+        ("/dashboard/nothing", 404),
+        ("/dashboard/top_tweets", 503),
+    ],
+)
+def test_rejects_bad_requests(get, url, status):
+    assert get(url)[0][0] == status
+
+
+def test_users_timelines_and_retweets(get):
+    (_, user), (_, timelines), (_, retweets) = get(
+        "/users/alice",
+        "/timelines?user_id=2&user_id=1&user_id=2",
+        "/retweets?tweet_id=5",
+    )
+    user = json.loads(user)
+    assert user["user"]["Name"] == "alice" and len(user["tweets"]) == 2
+    timelines = json.loads(timelines)["timelines"]
+    assert list(timelines) == ["2", "1"] and len(timelines["2"]) == 2
+    assert json.loads(retweets)["retweets"] == {"5": []}
+
+
+def test_dashboard_and_metrics(get):
+    (_, health), (_, dashboard), (_, metric), (status, metrics) = get(
+        "/health", "/dashboard", "/dashboard/top_users", "/metrics"
+    )
+    assert json.loads(health) == {"status": "ok", "indexes_ready": False}
+    dashboard = json.loads(dashboard)
+    assert dashboard["top_users"][0]["id"] == 0 and dashboard["top_tweets"] is None
+    assert json.loads(metric) == dashboard["top_users"]
+    assert status == 200
+    assert 'cache_hits_total{cache="search_l1"}' in metrics
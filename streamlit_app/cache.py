@@ -1,158 +1,960 @@
+import contextlib
+import functools
+import heapq
+import itertools
+import json
+import os
+import struct
+import sys
+import tempfile
+import threading
 import time
+import weakref
 
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from collections.abc import MutableMapping
+from datetime import datetime
 
 import redis
-import json
 import pandas as pd
+import pickle
 import random
 
-# from util import (
-#     _TTLLink,
-#     _TTLLinkedList,
-# )
-
-__all__ = ("Base", "LRUCache", "TTLCache", "RedisCache")
+from io import BytesIO
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover
+    pa = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:  # pragma: no cover
+    lz4 = None
+
+__all__ = (
+    "Base",
+    "LRUCache",
+    "TTLCache",
+    "TinyLFUCache",
+    "StripedCache",
+    "RedisCache",
+    "RefreshAhead",
+    "TieredCache",
+    "NEGATIVE",
+    "SingleFlight",
+    "SearchKey",
+    "RangeCache",
+    "CacheStats",
+    "to_prometheus",
+    "ArrowCodec",
+    "JsonCodec",
+    "PickleCodec",
+    "sizeof",
+)
 
 # from collections import OrderedDict
 
 
-class _TTLLink:
-    """Link in TTL Doubly Linked List.
+class _Negative:
+    """Marker cached in place of a result that does not exist."""
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return "NEGATIVE"
+
+    def __reduce__(self):
+        return "NEGATIVE"
+
+
+NEGATIVE = _Negative()
+
+
+class _Link:
+    """Cache entry and its position in the cache's linked list.
 
     Attributes:
         key (hashable): Cache Item Key.
-        expiry (int): Item Expiry Time.
-        next (_TTLLink): Next Link in the DLL.
-        prev (_TTLLink): Prev Link in the DLL. None
-        if no previous link exists.
+        value (object): Cache Item Value.
+        weight (int): Cache Item Weight.
+        expiry (float): Item Expiry Time, None if the
+        cache has no TTL.
+        next (_Link): Next Link in the DLL.
+        prev (_Link): Prev Link in the DLL.
     """
 
-    def __init__(self, key=None, expiry=None, nxt=None, prev=None):
+    __slots__ = ("key", "value", "weight", "expiry", "next", "prev")
+
+    def __init__(self, key=None, value=None, weight=0):
         self.key = key
-        self.expiry = expiry
-        self.next = nxt
-        self.prev = prev
+        self.value = value
+        self.weight = weight
+        self.expiry = None
+        # A lone link is its own neighbour, which makes
+        # it usable as the root of an empty circular list.
+        self.next = self.prev = self
+
+
+def _sweeper(ref, interval, stop):
+    """Background expiry loop of a `TTLCache`.
+
+    Only holds a weak reference to the cache so an abandoned
+    cache can still be garbage collected. Expired items are
+    evicted in bounded batches so the sweeper never holds the
+    cache lock for longer than a single foreground operation.
+
+    Args:
+        ref (weakref.ref): Weak reference to the cache.
+        interval (float): Seconds between sweeps.
+        stop (threading.Event): Set to stop the sweeper.
+    """
+    while not stop.wait(interval):
+        cache = ref()
+        if cache is None:
+            return
+        while cache.sweep(cache.max_expire) == cache.max_expire:
+            pass
+        del cache
+
 
+class CacheStats:
+    """Counters and latency histograms of a cache.
 
-class _TTLLinkedList:
-    """Doubly Linked List of TTL Links.
+    Latencies are bucketed by powers of two: bucket `i` counts
+    operations that took less than `2**i` nanoseconds. In-memory
+    caches only time one in `sample` operations to keep the
+    clock off the hit path, so histogram counts are sample counts.
 
     Attributes:
-        head (_TTLLink): Head of the Linked List.
+        sample (int): Power of two, the timing sample interval
+        of in-memory caches. Defaults to 16.
+        hits (int): Lookups that found an item.
+        misses (int): Lookups that found nothing.
+        sets (int): Items stored.
+        evictions (int): Items evicted to make room.
+        expirations (int): Items removed because they expired.
+        negative_hits (int): Lookups answered by a cached `NEGATIVE`.
+        negative_misses (int): Loads that found nothing and cached
+        a `NEGATIVE`.
+        bytes_read (int): Payload bytes read, for remote caches.
+        bytes_written (int): Payload bytes written, for remote caches.
     """
 
-    def __init__(self, head=None) -> None:
-        self.__head = head
-        # 'TTLCache' only inserts at the end of the
-        # list. Reference to the tail of the list
-        # for O(1) insertions.
-        self.__tail = head
+    OPS = ("get", "set")
 
-    @property
-    def head(self):
-        """Returns the head of the linked list."""
-        return self.__head
+    def __init__(self, sample=16):
+        self.sample_mask = sample - 1
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.negative_hits = 0
+        self.negative_misses = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+        self._buckets = {op: [0] * 64 for op in self.OPS}
+        self._sums = dict.fromkeys(self.OPS, 0)
 
-    def insert(self, link):
-        """Insert a new link at the end of the linked list.
+    def observe(self, op, elapsed_ns):
+        """Record the latency of an operation.
 
         Args:
-            link (_TTLLink): `_TTLLink` to insert.
+            op (str): "get" or "set".
+            elapsed_ns (int): Duration in nanoseconds.
         """
-        if self.__head:
-            link.prev = self.__tail
-            link.prev.next = self.__tail = link
-        else:
-            self.__head = self.__tail = link
+        self._buckets[op][min(elapsed_ns.bit_length(), 63)] += 1
+        self._sums[op] += elapsed_ns
+
+    @classmethod
+    def merge(cls, stats):
+        """Sum several `CacheStats` into a new one."""
+        merged = cls()
+        for other in stats:
+            for name in _STAT_COUNTERS:
+                setattr(merged, name, getattr(merged, name) + getattr(other, name))
+            for op in cls.OPS:
+                merged._sums[op] += other._sums[op]
+                for idx, count in enumerate(other._buckets[op]):
+                    merged._buckets[op][idx] += count
+        return merged
+
+    def histogram(self, op):
+        """Cumulative latency histogram of an operation.
+
+        Returns:
+            list: `(upper bound in seconds, count)` pairs up to
+            the slowest recorded operation.
+        """
+        buckets = self._buckets[op]
+        last = max((idx for idx, count in enumerate(buckets) if count), default=0)
+        total = 0
+        histogram = []
+        for idx in range(last + 1):
+            total += buckets[idx]
+            histogram.append(((1 << idx) / 1e9, total))
+        return histogram
+
+    def quantile(self, op, q):
+        """Upper bound in seconds of the `q`-quantile latency."""
+        histogram = self.histogram(op)
+        count = histogram[-1][1]
+        if not count:
+            return 0.0
+        for bound, total in histogram:
+            if total >= q * count:
+                return bound
+        return histogram[-1][0]
+
+    def snapshot(self):
+        """Current statistics as a plain dict."""
+        lookups = self.hits + self.misses
+        snapshot = {name: getattr(self, name) for name in _STAT_COUNTERS}
+        snapshot["hit_ratio"] = self.hits / lookups if lookups else 0.0
+        snapshot["latency"] = {}
+        for op in self.OPS:
+            count = sum(self._buckets[op])
+            snapshot["latency"][op] = {
+                "count": count,
+                "mean_seconds": self._sums[op] / count / 1e9 if count else 0.0,
+                "p50_seconds": self.quantile(op, 0.5),
+                "p99_seconds": self.quantile(op, 0.99),
+            }
+        return snapshot
+
+
+_STAT_COUNTERS = (
+    "hits",
+    "misses",
+    "sets",
+    "evictions",
+    "expirations",
+    "negative_hits",
+    "negative_misses",
+    "bytes_read",
+    "bytes_written",
+)
+
+
+def to_prometheus(caches, namespace="cache"):
+    """Render cache statistics in the Prometheus text format.
+
+    Args:
+        caches (dict): Caches by name. Each cache exposes `stats`,
+        and optionally `weight` and `__len__`.
+        namespace (str): Metric name prefix. Defaults to "cache".
+
+    Returns:
+        str: Metrics in the Prometheus text exposition format.
+    """
+    stats = {name: cache.stats for name, cache in caches.items()}
+    lines = []
+    for counter in _STAT_COUNTERS:
+        metric = f"{namespace}_{counter}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for name, stat in stats.items():
+            lines.append(f'{metric}{{cache="{name}"}} {getattr(stat, counter)}')
+
+    gauges = (("items", len), ("weight", lambda cache: cache.weight))
+    for gauge, measure in gauges:
+        metric = f"{namespace}_{gauge}"
+        lines.append(f"# TYPE {metric} gauge")
+        for name, cache in caches.items():
+            try:
+                value = measure(cache)
+            except (TypeError, AttributeError):
+                continue
+            lines.append(f'{metric}{{cache="{name}"}} {value}')
+
+    metric = f"{namespace}_latency_seconds"
+    lines.append(f"# TYPE {metric} histogram")
+    for name, stat in stats.items():
+        for op in CacheStats.OPS:
+            labels = f'cache="{name}",op="{op}"'
+            histogram = stat.histogram(op)
+            for bound, total in histogram:
+                lines.append(f'{metric}_bucket{{{labels},le="{bound:.9g}"}} {total}')
+            lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {histogram[-1][1]}')
+            lines.append(f"{metric}_sum{{{labels}}} {stat._sums[op] / 1e9}")
+            lines.append(f"{metric}_count{{{labels}}} {histogram[-1][1]}")
+    return "\n".join(lines) + "\n"
+
+
+class PickleCodec:
+    """Binary codec for arbitrary Python objects.
+
+    Decoding runs arbitrary code, so it is only fit for payloads
+    nobody else can write. `RedisCache` does not use it unless it
+    is passed in `codecs`.
+    """
 
-    def remove(self, link):
-        """Remove a link from the linked list.
+    tag = b"p"
 
-        Args:
-            link (_TTLLink): `_TTLLink` to remove.
-        """
-        if self.__head == link:
-            self.__head = self.__head.next
-        elif self.__tail == link:
-            self.__tail = self.__tail.prev
-        else:
-            link.prev.next = link.next
-            link.next.prev = link.prev
+    def accepts(self, obj):
+        return True
+
+    def encode(self, obj):
+        return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def decode(self, data):
+        return pickle.loads(data)
+
+
+class ArrowCodec:
+    """Columnar codec storing DataFrames as Arrow IPC streams.
+
+    Keeps column dtypes (timestamps, int64 ids) intact and
+    decodes without parsing. Requires `pyarrow`.
+    """
+
+    tag = b"a"
+
+    def accepts(self, obj):
+        return pa is not None and isinstance(obj, pd.DataFrame)
+
+    def encode(self, obj):
+        table = pa.Table.from_pandas(obj, preserve_index=True)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    def decode(self, data):
+        return pa.ipc.open_stream(data).read_all().to_pandas()
+
+
+class JsonCodec:
+    """Binary codec for plain values and containers of DataFrames.
+
+    The value is written as JSON, except DataFrames which are
+    replaced by references to Arrow IPC streams appended after
+    it, or stored as JSON if Arrow cannot encode them. Tuples,
+    datetimes and dicts with other than string keys are tagged
+    so they decode to the same types. Decoding never runs code.
+
+    Attributes:
+        types (iterable, optional): Namedtuple classes that may
+        be encoded, e.g. `SearchKey`. Others are encoded as
+        plain tuples.
+    """
+
+    tag = b"j"
+    _LENGTH = struct.Struct(">Q")
+
+    def __init__(self, types=()):
+        self._types = {cls.__name__: cls for cls in types}
+        self._arrow = ArrowCodec()
+
+    def accepts(self, obj):
+        return True
+
+    def _tree(self, obj, frames):
+        if obj is None or isinstance(obj, (bool, int, float, str)):
+            return obj
+        if isinstance(obj, pd.DataFrame):
+            if self._arrow.accepts(obj):
+                try:
+                    frames.append(self._arrow.encode(obj))
+                    return {"$frame": len(frames) - 1}
+                except (TypeError, ValueError):
+                    pass
+            return {"$json": obj.to_json(orient="split", date_format="iso")}
+        if isinstance(obj, pd.Timestamp):
+            return {"$timestamp": obj.isoformat()}
+        if isinstance(obj, datetime):
+            return {"$datetime": obj.isoformat()}
+        if isinstance(obj, tuple):
+            fields = [self._tree(item, frames) for item in obj]
+            name = type(obj).__name__
+            if self._types.get(name) is type(obj):
+                return {"$type": name, "fields": fields}
+            return {"$tuple": fields}
+        if isinstance(obj, list):
+            return [self._tree(item, frames) for item in obj]
+        if isinstance(obj, dict):
+            if all(isinstance(k, str) and not k.startswith("$") for k in obj):
+                return {k: self._tree(v, frames) for k, v in obj.items()}
+            return {
+                "$dict": [
+                    [self._tree(k, frames), self._tree(v, frames)]
+                    for k, v in obj.items()
+                ]
+            }
+        if hasattr(obj, "item"):
+            # numpy scalars
+            return self._tree(obj.item(), frames)
+        raise TypeError(f"cannot encode {type(obj).__name__} as JSON")
+
+    def _value(self, tree, frames):
+        if isinstance(tree, list):
+            return [self._value(item, frames) for item in tree]
+        if not isinstance(tree, dict):
+            return tree
+        if "$frame" in tree:
+            return self._arrow.decode(frames[tree["$frame"]])
+        if "$json" in tree:
+            return pd.read_json(BytesIO(tree["$json"].encode()), orient="split")
+        if "$timestamp" in tree:
+            return pd.Timestamp(tree["$timestamp"])
+        if "$datetime" in tree:
+            return datetime.fromisoformat(tree["$datetime"])
+        if "$tuple" in tree:
+            return tuple(self._value(item, frames) for item in tree["$tuple"])
+        if "$type" in tree:
+            fields = [self._value(item, frames) for item in tree["fields"]]
+            cls = self._types.get(tree["$type"])
+            return tuple(fields) if cls is None else cls(*fields)
+        if "$dict" in tree:
+            return {
+                self._value(k, frames): self._value(v, frames)
+                for k, v in tree["$dict"]
+            }
+        return {k: self._value(v, frames) for k, v in tree.items()}
+
+    def encode(self, obj):
+        frames = []
+        header = json.dumps(self._tree(obj, frames), separators=(",", ":")).encode()
+        parts = [self._LENGTH.pack(len(header)), header]
+        for frame in frames:
+            parts += [self._LENGTH.pack(len(frame)), frame]
+        return b"".join(parts)
+
+    def decode(self, data):
+        data = memoryview(data)
+        size = self._LENGTH.size
+        (length,) = self._LENGTH.unpack_from(data)
+        tree = json.loads(bytes(data[size : size + length]))
+        frames, offset = [], size + length
+        while offset < len(data):
+            (length,) = self._LENGTH.unpack_from(data, offset)
+            offset += size
+            frames.append(data[offset : offset + length])
+            offset += length
+        return self._value(tree, frames)
+
+
+def _compressors():
+    """Available compressors as `name: (tag, compress, decompress)`."""
+    compressors = {}
+    if zstandard is not None:
+        compressors["zstd"] = (
+            b"z",
+            zstandard.ZstdCompressor().compress,
+            zstandard.ZstdDecompressor().decompress,
+        )
+    if lz4 is not None:
+        compressors["lz4"] = (b"l", lz4.frame.compress, lz4.frame.decompress)
+    return compressors
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _connection_pool(host, port, db, max_connections):
+    """Process-wide Redis connection pool per `(host, port, db)`."""
+    with _pools_lock:
+        try:
+            return _pools[(host, port, db)]
+        except KeyError:
+            pool = redis.BlockingConnectionPool(
+                host=host, port=port, db=db, max_connections=max_connections
+            )
+            _pools[(host, port, db)] = pool
+            return pool
 
 
 class RedisCache:
-    def __init__(self, host="localhost", port=6379, db=0):
+    """Redis-backed persistent cache.
+
+    Values are framed as `NUL | codec tag | compression tag | body`,
+    except `NEGATIVE` which is stored as the two bytes `NUL | "!"`.
+    The first codec accepting a value encodes it, so DataFrames
+    are stored as Arrow IPC and everything else as JSON, see
+    `JsonCodec`. Payloads are never unpickled by default. Bodies
+    larger than `compress_threshold` bytes are compressed if the
+    requested compressor is installed.
+
+    Attributes:
+        host (str): Redis host. Defaults to "localhost".
+        port (int): Redis port. Defaults to 6379.
+        db (int): Redis database. Defaults to 0.
+        codecs (list, optional): Codecs in order of preference.
+        Defaults to `ArrowCodec`, then `JsonCodec`.
+        compression (str, optional): "zstd", "lz4" or None.
+        Defaults to "zstd".
+        compress_threshold (int): Minimum body size in bytes
+        that gets compressed. Defaults to 4096.
+        max_connections (int): Size of the connection pool shared
+        by all `RedisCache` instances of the same server and db.
+        Defaults to 32.
+    """
+
+    _HEADER = b"\x00"
+    _UNCOMPRESSED = b"-"
+    _NEGATIVE = b"\x00!"
+
+    def __init__(
+        self,
+        host="localhost",
+        port=6379,
+        db=0,
+        codecs=None,
+        compression="zstd",
+        compress_threshold=4096,
+        max_connections=32,
+    ):
         """Initialize Redis connection"""
-        self.redis = redis.StrictRedis(host=host, port=port, db=db)
+        self.redis = redis.StrictRedis(
+            connection_pool=_connection_pool(host, port, db, max_connections)
+        )
+        self._flights = SingleFlight()
+        # Redis round trips dwarf the clock, time every one.
+        self.stats = CacheStats(sample=1)
+
+        if codecs is None:
+            codecs = [ArrowCodec(), JsonCodec()]
+        self._codecs = codecs
+        self._decoders = {codec.tag: codec for codec in codecs}
+
+        compressors = _compressors()
+        self._compressor = compressors.get(compression)
+        self._decompressors = {tag: dec for tag, _, dec in compressors.values()}
+        self.compress_threshold = compress_threshold
+
+    def encode(self, obj):
+        """Serialize an object into a framed payload."""
+        if obj is NEGATIVE:
+            return self._NEGATIVE
+        for codec in self._codecs:
+            if not codec.accepts(obj):
+                continue
+            try:
+                body = codec.encode(obj)
+            except (TypeError, ValueError):
+                # e.g. mixed-type columns Arrow cannot infer a type
+                # for, fall through to the next codec.
+                continue
+            break
+        else:
+            raise TypeError(f"no codec can encode {type(obj).__name__}")
+
+        compression = self._UNCOMPRESSED
+        if self._compressor and len(body) >= self.compress_threshold:
+            compression, compress, _ = self._compressor
+            body = compress(body)
+        return self._HEADER + codec.tag + compression + body
+
+    def decode(self, data):
+        """Deserialize a payload produced by `encode`.
+
+        Values written before framing was introduced are
+        returned as stored, except JSON-encoded DataFrames
+        which are still decoded into DataFrames. Values of a
+        codec this cache does not use decode to None, a miss.
+        """
+        if data is None:
+            return None
+        if data == self._NEGATIVE:
+            return NEGATIVE
+        if data[:1] != self._HEADER:
+            if data[:2] == b'{"':
+                try:
+                    return pd.read_json(BytesIO(data))
+                except ValueError:
+                    pass
+            return data
+
+        codec, compression, body = data[1:2], data[2:3], data[3:]
+        decoder = self._decoders.get(codec)
+        if decoder is None:
+            return None
+        if compression != self._UNCOMPRESSED:
+            body = self._decompressors[compression](body)
+        return decoder.decode(body)
 
     def exists(self, key):
         """Check if the key exists in Redis"""
         return self.redis.exists(key)
 
-    def set(self, key, obj, expire=None):
+    def set(self, key, obj, expire=None, nx=False):
         """Store the object in Redis, optionally setting an expiry time"""
-        if isinstance(obj, pd.DataFrame):
-            self.redis.set(key, obj.to_json())
-        elif isinstance(obj, (dict, list)):
-            obj = json.dumps(obj)
-        else:
-            self.redis.set(key, obj, ex=expire, nx=True)
+        start = time.perf_counter_ns()
+        data = self.encode(obj)
+        self.redis.set(key, data, ex=expire, nx=nx)
+        self.stats.sets += 1
+        self.stats.bytes_written += len(data)
+        self.stats.observe("set", time.perf_counter_ns() - start)
 
     def get(self, key):
         """Retrieve the object from Redis, if available"""
-        # obj = self.redis.get(key)
-        # if obj:
-        #     obj = json.loads(obj)
-        #     return obj
-        return self.redis.get(key)
+        start = time.perf_counter_ns()
+        data = self.redis.get(key)
+        obj = self.decode(data)
+        self._record_read(data)
+        self.stats.observe("get", time.perf_counter_ns() - start)
+        return obj
+
+    def _record_read(self, data):
+        if data is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+            self.stats.bytes_read += len(data)
+
+    def get_or_none(self, key):
+        """Retrieve the object from Redis, or None if it is
+        missing or Redis cannot be reached"""
+        try:
+            return self.get(key)
+        except redis.RedisError:
+            return None
+
+    def get_or_load(self, key, loader, expire=None):
+        """Retrieve the object, computing and storing it on a miss.
+
+        Concurrent misses of the same key in this process share
+        a single call of `loader`.
+
+        Args:
+            key (str): Key.
+            loader (callable): Called without arguments to
+            compute the object.
+            expire (int, optional): Expiry time in seconds.
+        """
+        obj = self.get_or_none(key)
+        if obj is not None:
+            return obj
+
+        def fill():
+            # Another process may have stored it meanwhile.
+            obj = self.get_or_none(key)
+            if obj is None:
+                obj = loader()
+                try:
+                    self.set(key, obj, expire=expire)
+                except redis.RedisError:
+                    pass
+            return obj
+
+        return self._flights.do(key, fill)
+
+    def get_many(self, keys):
+        """Retrieve several objects in one round trip.
+
+        Args:
+            keys (list): Keys to retrieve.
+
+        Returns:
+            list: Objects in the order of `keys`, None for
+            missing keys.
+        """
+        if not keys:
+            return []
+        start = time.perf_counter_ns()
+        payloads = self.redis.mget(keys)
+        objs = [self.decode(data) for data in payloads]
+        for data in payloads:
+            self._record_read(data)
+        self.stats.observe("get", time.perf_counter_ns() - start)
+        return objs
+
+    def set_many(self, mapping, expire=None):
+        """Store several objects in one pipelined round trip.
+
+        Args:
+            mapping (dict): Objects by key.
+            expire (int, optional): Expiry time in seconds.
+        """
+        start = time.perf_counter_ns()
+        pipe = self.redis.pipeline(transaction=False)
+        for key, obj in mapping.items():
+            data = self.encode(obj)
+            pipe.set(key, data, ex=expire)
+            self.stats.sets += 1
+            self.stats.bytes_written += len(data)
+        pipe.execute()
+        self.stats.observe("set", time.perf_counter_ns() - start)
 
     def delete(self, key):
         """Delete the object from Redis"""
         self.redis.delete(key)
 
 
+_RefreshJob = namedtuple("_RefreshJob", "key loader interval ttl ready")
+
+
+class RefreshAhead:
+    """Background recomputation of values stored in a `RedisCache`.
+
+    Every job recomputes its value on its own daemon thread every
+    `interval` seconds and replaces the stored value with a single
+    SET, so readers see either the previous or the new value and
+    never a missing one. Values expire after `ttl` seconds, so
+    they disappear if every refresher stops.
+
+    A lease key in Redis lets a single process recompute a job
+    per interval when several processes refresh the same keys.
+
+    Attributes:
+        cache (RedisCache): Cache storing the values.
+        lease_prefix (str): Prefix of lease keys. Defaults
+        to "refresh-lease:".
+        poll_interval (float): Seconds between checks while
+        another process computes a missing value. Defaults to 1.
+    """
+
+    def __init__(self, cache, lease_prefix="refresh-lease:", poll_interval=1.0):
+        self.cache = cache
+        self.lease_prefix = lease_prefix
+        self.poll_interval = poll_interval
+
+        self._jobs = {}
+        self._stop = threading.Event()
+        self._started = False
+
+    def add(self, key, loader, interval, ttl=None):
+        """Register a value to keep fresh.
+
+        Args:
+            key (str): Key of the value.
+            loader (callable): Called without arguments to
+            compute the value.
+            interval (int): Seconds between recomputations.
+            ttl (int, optional): Expiry of the stored value in
+            seconds. Defaults to three intervals.
+        """
+        if ttl is None:
+            ttl = 3 * interval
+        job = _RefreshJob(key, loader, interval, ttl, threading.Event())
+        self._jobs[key] = job
+        if self._started:
+            self._spawn(job)
+
+    def start(self):
+        """Start refreshing every registered value."""
+        self._started = True
+        for job in self._jobs.values():
+            self._spawn(job)
+
+    def stop(self):
+        """Stop refreshing after the running recomputations."""
+        self._stop.set()
+
+    def _spawn(self, job):
+        threading.Thread(
+            target=self._run, args=(job,), name=f"refresh-{job.key}", daemon=True
+        ).start()
+
+    def _run(self, job):
+        while not self._stop.is_set():
+            try:
+                delay = job.interval if self.refresh(job.key) else self.poll_interval
+            except Exception:
+                # Keep the previous value until the next attempt.
+                delay = job.interval
+            if self._stop.wait(delay):
+                return
+
+    def refresh(self, key):
+        """Recompute and store a value unless another process
+        holds its lease.
+
+        Returns:
+            bool: Whether the stored value is current.
+        """
+        job = self._jobs[key]
+        lease = self.lease_prefix + key
+        if not self.cache.redis.set(lease, b"1", ex=job.interval, nx=True):
+            if self.cache.exists(key):
+                job.ready.set()
+                return True
+            return False
+
+        try:
+            value = job.loader()
+        except Exception:
+            self.cache.redis.delete(lease)
+            raise
+        self.cache.set(key, value, expire=job.ttl)
+        job.ready.set()
+        return True
+
+    def wait(self, keys=None, timeout=None):
+        """Block until values have been computed at least once.
+
+        Args:
+            keys (list, optional): Keys to wait for. Defaults to all.
+            timeout (float, optional): Maximum seconds to wait.
+
+        Returns:
+            bool: Whether all the values are available.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for key in self._jobs if keys is None else keys:
+            remaining = None
+            if deadline is not None:
+                remaining = max(deadline - time.monotonic(), 0)
+            if not self._jobs[key].ready.wait(remaining):
+                return False
+        return True
+
+
+def sizeof(obj):
+    """Approximate the in-memory size of a cached value in bytes.
+
+    DataFrames are measured with `DataFrame.memory_usage(deep=True)`,
+    containers are measured recursively and everything else falls
+    back to `sys.getsizeof`.
+
+    Args:
+        obj (object): Value to measure.
+
+    Returns:
+        int: Size of the value in bytes.
+    """
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, (tuple, list, set, frozenset)):
+        return sys.getsizeof(obj) + sum(sizeof(itm) for itm in obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(
+            sizeof(key) + sizeof(value) for key, value in obj.items()
+        )
+    return sys.getsizeof(obj)
+
+
 class Base(MutableMapping):
     """Cache base-class.
 
     Evicts the oldest item from the cache
     when the cache reaches maximum capacity.
 
+    If `max_weight` is set, every item is also weighed by
+    `weigher` and items are evicted until the total weight
+    of the cache fits the budget.
+
+    Items are stored as `_Link` objects in a single dict.
+    Subclasses keep their eviction order by threading the
+    same links into a list through the `_link`, `_touch`
+    and `_unlink` hooks instead of keeping a second index.
+
     Attributes:
-        capacity (int): Maximum capacity of the cache.
+        capacity (int): Maximum capacity of the cache. None
+        for no limit on the number of items.
         callback (callable, optional): Callable defining
         behaviour when an item is evicted from the cache.
         Defaults to None.
+        max_weight (int, optional): Maximum total weight of
+        the cache, e.g. in bytes. Defaults to None.
+        weigher (callable, optional): Callable returning the
+        weight of a value. Defaults to `sizeof` when
+        `max_weight` is set.
     """
 
     __singleton = object()
 
-    def __init__(self, capacity, callback=None):
-        self.__cache = {}
+    def __init__(self, capacity, callback=None, max_weight=None, weigher=None):
+        # Dict Mapping Keys to `_Links`
+        self._links = {}
 
-        self.__size = 0  # Number of Items in the Cache
+        self.__weight = 0  # Total Weight of the Items in the Cache
+        self.stats = CacheStats()
         self.__capacity = capacity
+        self.__max_weight = max_weight
         self._callback = callback
 
+        if weigher is None and max_weight is not None:
+            weigher = sizeof
+        self._weigher = weigher
+
     @property
     def capacity(self):
         return self.__capacity
 
+    @property
+    def max_weight(self):
+        return self.__max_weight
+
+    @property
+    def weight(self):
+        """Total weight of the items in the cache."""
+        return self.__weight
+
+    def __full(self, weight):
+        if self.__capacity is not None and len(self._links) >= self.__capacity:
+            return True
+        if self.__max_weight is not None:
+            return self.__weight + weight > self.__max_weight
+        return False
+
+    def _link(self, link):
+        """Hook called when a new link was added."""
+
+    def _touch(self, link):
+        """Hook called when an existing link was read or updated."""
+
+    def _unlink(self, link):
+        """Hook called when a link was removed."""
+
     def __setitem__(self, _key, _value):
-        if _key not in self.__cache:
-            while self.__size >= self.__capacity:
+        stats = self.stats
+        stats.sets += 1
+        start = 0 if stats.sets & stats.sample_mask else time.perf_counter_ns()
+        if self._weigher is None:
+            weight = 0
+        else:
+            weight = self._weigher(_value)
+            if self.__max_weight is not None and weight > self.__max_weight:
+                raise ValueError("value too large")
+
+        link = self._links.get(_key)
+        if link is not None and link.weight != weight:
+            # Re-insert so that the new weight goes
+            # through the regular eviction path.
+            del self[_key]
+            link = None
+
+        if link is None:
+            while self._links and self.__full(weight):
                 self._evict()
-            self.__cache[_key] = _value
-            self.__size += 1
+            self._links[_key] = link = _Link(_key, _value, weight)
+            self.__weight += weight
+            self._link(link)
         else:
-            self.__cache[_key] = _value
+            link.value = _value
+            self._touch(link)
+        if start:
+            stats.observe("set", time.perf_counter_ns() - start)
 
     def __getitem__(self, _key):
+        stats = self.stats
+        if (stats.hits + stats.misses) & stats.sample_mask:
+            start = 0
+        else:
+            start = time.perf_counter_ns()
         try:
-            return self.__cache[_key]
+            link = self._links[_key]
         except KeyError:
+            stats.misses += 1
+            if start:
+                stats.observe("get", time.perf_counter_ns() - start)
             raise KeyError(_key) from None
+        self._touch(link)
+        stats.hits += 1
+        if start:
+            stats.observe("get", time.perf_counter_ns() - start)
+        return link.value
 
     def get(self, _key, _default=None):
         try:
@@ -161,8 +963,9 @@ class Base(MutableMapping):
             return _default
 
     def __delitem__(self, _key):
-        del self.__cache[_key]
-        self.__size -= 1
+        link = self._links.pop(_key)
+        self.__weight -= link.weight
+        self._unlink(link)
 
     def pop(self, _key, default=__singleton):
         try:
@@ -178,12 +981,13 @@ class Base(MutableMapping):
     def popitem(self):
         """Pop the most recent item from the cache."""
         try:
-            itm = self.__cache.popitem()
+            _key, link = self._links.popitem()
         except KeyError:
             raise KeyError("cache is empty") from None
         else:
-            self.__size -= 1
-            return itm
+            self.__weight -= link.weight
+            self._unlink(link)
+            return (_key, link.value)
 
     def _evict(self):
         """Evicts an item from the cache determined
@@ -193,109 +997,97 @@ class Base(MutableMapping):
             KeyError: Cache is empty.
         """
         try:
-            key = next(iter(self))
+            link = next(iter(self._links.values()))
         except StopIteration:
             raise KeyError("cache is empty") from None
 
-        value = self[key]
-        del self.__cache[key]
-        self.__size -= 1
+        Base.__delitem__(self, link.key)
+        self.stats.evictions += 1
 
         if self._callback:
-            self._callback(key, value)
+            self._callback(link.key, link.value)
 
-        return key, value
+        return link.key, link.value
 
     def __contains__(self, _key):
-        return _key in self.__cache
+        return _key in self._links
 
     def __iter__(self):
-        return iter(self.__cache)
+        return iter(self._links)
 
     def __len__(self):
-        return len(self.__cache)
+        return len(self._links)
 
     def __repr__(self):
-        return "{}{}".format(self.__class__.__name__, self.__cache)
+        return "{}{}".format(self.__class__.__name__, dict(self.items()))
 
     def keys(self):
-        return self.__cache.keys()
+        return self._links.keys()
 
     def values(self):
-        return self.__cache.values()
+        return [link.value for link in self._links.values()]
 
     def items(self):
-        return self.__cache.items()
+        return [(_key, link.value) for _key, link in self._links.items()]
 
     def __eq__(self, obj):
         if isinstance(obj, Base):
-            if self.__dict__ == obj.__dict__:
-                return True
+            if type(self) is type(obj) and self.capacity == obj.capacity:
+                return self.items() == obj.items()
         return False
 
 
 class LRUCache(Base):
     """Least Recently Used Cache.
 
+    Links are kept in a circular doubly linked list, the
+    most-recently used link right after the root and the
+    least-recently used one right before it.
+
     Attributes:
         capacity (int): Maximum capacity of the cache.
         callback (callable, optional): Callable defining
         behaviour when an item is evicted from the cache.
         Defaults to None.
+        max_weight (int, optional): Maximum total weight of
+        the cache. Defaults to None.
+        weigher (callable, optional): Callable returning the
+        weight of a value. Defaults to None.
     """
 
-    def __init__(self, capacity, callback=None):
-        Base.__init__(self, capacity, callback)
-        self._lru = OrderedDict()
+    def __init__(self, capacity, callback=None, max_weight=None, weigher=None):
+        Base.__init__(self, capacity, callback, max_weight, weigher)
+        self._root = _Link()
         self._id = random.randint(0, 1000)
 
-    def __getitem__(self, _key):
-        """Retrieves item from the cache.
-
-        If the item exists, retrieve it from the cache
-        and move it to the back of the OrderedDict.
-
-        Args:
-            _key (hashable): Key.
-        """
-        try:
-            _value = Base.__getitem__(self, _key)
-        except KeyError:
-            raise KeyError from None
-        else:
-            self._lru.move_to_end(_key, last=False)
-            return _value
-
-    def __setitem__(self, _key, _value):
-        """Add item to the cache..
-
-        If the item exists in the cache, update it's LRU ordering.
-        If the item does not exist in the cache, add the item and
-        then update it's LRU ordering.
-
-        Args:
-            _key (hashable): Item Key.
-            _value (object): Item Value.
-        """
-        Base.__setitem__(self, _key, _value)
-        self._lru[_key] = _value
+    def _link(self, link):
+        """Insert a new link as the most-recently used one."""
+        root = self._root
+        link.prev = root
+        link.next = nxt = root.next
+        root.next = nxt.prev = link
+
+    def _touch(self, link):
+        """Move a link to the front of the LRU ordering."""
+        root = self._root
+        if root.next is not link:
+            link.prev.next = link.next
+            link.next.prev = link.prev
+            link.prev = root
+            link.next = nxt = root.next
+            root.next = nxt.prev = link
 
-        # Update LRU Ordering
-        self._lru.move_to_end(_key, last=False)
-
-    def __delitem__(self, _key):
-        Base.__delitem__(self, _key)
-        del self._lru[_key]
+    def _unlink(self, link):
+        link.prev.next = link.next
+        link.next.prev = link.prev
 
     def popitem(self):
         """Force eviction of least-recently used item."""
-        try:
-            _key, _value = self._lru.popitem()
-        except KeyError:
-            raise KeyError("cannot pop from empty cache") from None
-        else:
-            Base.__delitem__(self, _key)
-            return (_key, _value)
+        link = self._root.prev
+        if link is self._root:
+            raise KeyError("cannot pop from empty cache")
+        Base.__delitem__(self, link.key)
+        return (link.key, link.value)
 
     def _evict(self):
         """Evict the least-recently used item.
@@ -313,16 +1105,21 @@ class LRUCache(Base):
         except KeyError:
             raise KeyError("cannot evict from empty cache") from None
         else:
+            self.stats.evictions += 1
             if self._callback:
                 self._callback(_key, _value)
 
     def exists(self, _key):
-        return _key in self._lru
+        return _key in self._links
 
     def print_all(self):
-        # for key in self._links:
-        #     print(key, self._links[key])
-        return self._lru.items()
+        # Items from the most- to the least-recently used.
+        items = []
+        link = self._root.next
+        while link is not self._root:
+            items.append((link.key, link.value))
+            link = link.next
+        return items
 
 
 class TTLCache(LRUCache):
@@ -330,6 +1127,16 @@ class TTLCache(LRUCache):
 
     Monotonic time is used to track key expiry times.
 
+    Expiry times are kept in a min-heap with lazy deletion:
+    overwritten or deleted keys leave stale heap entries behind
+    which are discarded when they reach the top. Every cache
+    operation evicts at most `max_expire` expired items, and
+    reads check the expiry of the requested key directly, so
+    a burst of expirations never lands on a single lookup.
+    A heap that is mostly stale is compacted the same way, at
+    most `max_expire` entries per write. `len()` may therefore
+    count expired items that were not evicted yet.
+
     Attributes:
         capacity (int): Maximum capacity of the cache.
         ttl (int): Cache items time-to-live.
@@ -338,147 +1145,1242 @@ class TTLCache(LRUCache):
         Defaults to None.
         time (callable): Callable time function used by the
         cache.
+        max_expire (int): Maximum number of expiry heap entries
+        processed per cache operation. Defaults to 16.
+        sweep_interval (float, optional): If set, expired items
+        are also removed by a background thread every
+        `sweep_interval` seconds. Defaults to None.
+        max_weight (int, optional): Maximum total weight of
+        the cache. Defaults to None.
+        weigher (callable, optional): Callable returning the
+        weight of a value. Defaults to None.
     """
 
-    def __init__(self, capacity, ttl, callback=None, _time=time.monotonic):
-        LRUCache.__init__(self, capacity, callback)
+    def __init__(
+        self,
+        capacity,
+        ttl,
+        callback=None,
+        _time=time.monotonic,
+        max_expire=16,
+        sweep_interval=None,
+        max_weight=None,
+        weigher=None,
+    ):
+        LRUCache.__init__(self, capacity, callback, max_weight, weigher)
 
         self._time = _time
         self.__ttl = ttl
+        self.max_expire = max_expire
+
+        # Min-heap of `(expiry, seq, _Link)` entries.
+        # An entry is stale once its link was removed from
+        # `_links` or its expiry was pushed back by an update.
+        self._heap = []
+        # Heap being compacted into `_heap`. Entries are taken
+        # off its end, which leaves the rest a valid heap.
+        self._stale = []
+        self._seq = itertools.count()
+
+        self._stop = None
+        if sweep_interval:
+            # The sweeper thread mutates the cache, so
+            # every operation has to hold the lock.
+            self._lock = threading.RLock()
+            self._stop = threading.Event()
+            threading.Thread(
+                target=_sweeper,
+                args=(weakref.ref(self), sweep_interval, self._stop),
+                name="ttlcache-sweeper",
+                daemon=True,
+            ).start()
+        else:
+            self._lock = contextlib.nullcontext()
 
-        # Dict Mapping Keys to `_TTLLinks`
-        # this is primarily used for O(1)
-        # lookup and deletions of `_TTLLinks`
-        self._links = {}
-
-        # Linked List of '_TTLLinks'
-        # The linked list is 'sorted' in time-ascending
-        # order. The key with the nearest expiry time is
-        # at the front of the list.
-        self._list = _TTLLinkedList()
+    @property
+    def ttl(self):
+        return self.__ttl
 
-    def expire(_time):
+    def expire(func):
         """Removes expired keys from the cache.
 
-        Decorator for class methods. Iterates over the linked
-        list and removes expired keys from the cache when
-        the cache is accessed.
+        Decorator for class methods. Pops at most `max_expire`
+        entries off the expiry heap before the wrapped method
+        runs, so the cost of expiring keys is spread over
+        many cache accesses instead of a single one.
         """
 
-        def wrap(func):
-            def wrapped_f(self, *args):
-                curr = self._list.head
+        @functools.wraps(func)
+        def wrapped_f(self, *args):
+            with self._lock:
+                self._expire(self.max_expire)
+                return func(self, *args)
 
-                while curr:
-                    if curr.expiry <= _time():
-                        LRUCache.__delitem__(self, curr.key)
-                        self._list.remove(curr)
-                        del self._links[curr.key]
-                        curr = curr.next
-                    else:
-                        return func(self, *args)
+        return wrapped_f
 
-                return func(self, *args)
+    def _expire(self, limit=None):
+        """Evict expired items in expiry order.
+
+        Args:
+            limit (int, optional): Maximum number of heap
+            entries to process. Defaults to None (no limit).
+
+        Returns:
+            int: Number of heap entries processed.
+        """
+        heap, stale = self._heap, self._stale
+        now = self._time()
+        count = 0
+        while True:
+            if stale and (not heap or stale[0] < heap[0]):
+                top = stale
+            else:
+                top = heap
+            if not top or top[0][0] > now:
+                break
+            if limit is not None and count >= limit:
+                break
+            expiry, _, link = heapq.heappop(top)
+            count += 1
+            if self._links.get(link.key) is link and link.expiry == expiry:
+                Base.__delitem__(self, link.key)
+                self.stats.expirations += 1
+        return count
+
+    def _expired(self, _key):
+        """Remove `_key` if it has expired.
+
+        Returns:
+            bool: True if the key is absent or has expired.
+        """
+        link = self._links.get(_key)
+        if link is None:
+            return True
+        if link.expiry <= self._time():
+            Base.__delitem__(self, _key)
+            self.stats.expirations += 1
+            return True
+        return False
 
-            return wrapped_f
+    def sweep(self, limit=None):
+        """Remove expired items from the cache.
 
-        return wrap
+        Args:
+            limit (int, optional): Maximum number of heap
+            entries to process. Defaults to None (no limit).
 
-    @expire(_time=time.monotonic)
-    def __setitem__(self, _key, _value):
+        Returns:
+            int: Number of heap entries processed.
+        """
+        with self._lock:
+            count = self._expire(limit)
+            return count + self._compact(None if limit is None else limit - count)
+
+    def close(self):
+        """Stop the background sweeper, if any."""
+        if self._stop is not None:
+            self._stop.set()
+
+    def _compact(self, limit=None):
+        """Drop stale entries from the expiry heap.
+
+        Once the heap is mostly stale it is set aside and its
+        live entries are moved back into a fresh heap, at most
+        `limit` of them per call.
+
+        Args:
+            limit (int, optional): Maximum number of heap
+            entries to process. Defaults to None (no limit).
+
+        Returns:
+            int: Number of heap entries processed.
+        """
+        if not self._stale:
+            if len(self._heap) <= 2 * len(self._links) + 64:
+                return 0
+            self._stale, self._heap = self._heap, []
+        heap, stale, links = self._heap, self._stale, self._links
+        count = 0
+        while stale and (limit is None or count < limit):
+            entry = stale.pop()
+            count += 1
+            link = entry[2]
+            if links.get(link.key) is link and link.expiry == entry[0]:
+                heapq.heappush(heap, entry)
+        return count
+
+    def _store(self, _key, _value, ttl):
         LRUCache.__setitem__(self, _key, _value)
-        try:
-            link = self._links[_key]
-        except KeyError:
-            expiry = self._time() + self.__ttl
-            self._links[_key] = link = _TTLLink(_key, expiry, None, None)
-        else:
-            self._list.remove(link)
-            expiry = self._time() + self.__ttl
+        link = self._links[_key]
+        expiry = self._time() + ttl
+        # An unchanged expiry is still in the heap, pushing
+        # it again would leave an entry that never goes stale.
+        if link.expiry != expiry:
             link.expiry = expiry
+            heapq.heappush(self._heap, (expiry, next(self._seq), link))
+        self._compact(self.max_expire)
+
+    @expire
+    def __setitem__(self, _key, _value):
+        self._store(_key, _value, self.__ttl)
+
+    @expire
+    def set(self, _key, _value, ttl=None):
+        """Add item to the cache with its own time-to-live.
+
+        Args:
+            _key (hashable): Item Key.
+            _value (object): Item Value.
+            ttl (float, optional): Item time-to-live. Defaults
+            to the cache's TTL.
+        """
+        self._store(_key, _value, self.__ttl if ttl is None else ttl)
+
+    @expire
+    def hot_items(self, limit=None):
+        """Unexpired items from the most- to the least-recently used.
 
-        self._list.insert(link)
+        Args:
+            limit (int, optional): Maximum number of items.
 
-    @expire(_time=time.monotonic)
+        Returns:
+            list: `(key, value, remaining ttl)` tuples.
+        """
+        now = self._time()
+        items = []
+        link = self._root.next
+        while link is not self._root and (limit is None or len(items) < limit):
+            if link.expiry > now:
+                items.append((link.key, link.value, link.expiry - now))
+            link = link.next
+        return items
+
+    @expire
     def __getitem__(self, _key):
-        try:
-            _value = LRUCache.__getitem__(self, _key)
-        except KeyError:
-            raise KeyError(f"{_key}") from None
+        stats = self.stats
+        if (stats.hits + stats.misses) & stats.sample_mask:
+            start = 0
         else:
-            return _value
-
-    @expire(_time=time.monotonic)
+            start = time.perf_counter_ns()
+        link = self._links.get(_key)
+        if link is None or link.expiry <= self._time():
+            if link is not None:
+                Base.__delitem__(self, _key)
+                stats.expirations += 1
+            stats.misses += 1
+            if start:
+                stats.observe("get", time.perf_counter_ns() - start)
+            raise KeyError(f"{_key}")
+        self._touch(link)
+        stats.hits += 1
+        if start:
+            stats.observe("get", time.perf_counter_ns() - start)
+        return link.value
+
+    @expire
     def get(self, _key, _default=None):
         try:
             return self[_key]
         except KeyError:
             return _default
 
-    @expire(_time=time.monotonic)
+    @expire
     def __delitem__(self, _key):
         try:
             LRUCache.__delitem__(self, _key)
         except KeyError:
             raise KeyError(f"{_key}") from None
-        else:
-            link = self._links[_key]
-            self._list.remove(link)
-            del self._links[_key]
 
-    @expire(_time=time.monotonic)
+    @expire
     def __contains__(self, _object: object):
-        return Base.__contains__(self, _object)
+        return not self._expired(_object)
 
-    @expire(_time=time.monotonic)
+    @expire
     def __iter__(self):
-        return Base.__iter__(self)
+        now = self._time()
+        return iter([key for key, link in self._links.items() if link.expiry > now])
 
-    @expire(_time=time.monotonic)
+    @expire
     def __len__(self):
+        # May still count expired items that were not swept
+        # yet, an exact length would need an unbounded sweep.
         return Base.__len__(self)
 
     def exists(self, _key):
-        return _key in self._links
+        return _key in self
 
     def print_all(self):
         # for key in self._links:
         #     print(key, self._links[key])
         return self._links.items()
 
+    @expire
+    def __str__(self):
+        return Base.__repr__(self)
+
+    def popitem(self):
+        """Evict the LRU item."""
+        with self._lock:
+            return LRUCache.popitem(self)
+
+    # Enable 'expire' decorator to be accessed
+    # outside of the scope of the class, while
+    # still being inside the class namespace.
+    expire = staticmethod(expire)
+
+
+class _CountMinSketch:
+    """Count-min sketch of 4-bit saturating counters.
+
+    Estimates access frequencies in a fixed amount of memory.
+    All counters are halved every `sample_size` additions so
+    that old popularity fades out.
+
+    Attributes:
+        capacity (int): Number of keys the sketch is sized for.
+    """
+
+    _SEEDS = (
+        0x9E3779B97F4A7C15,
+        0xC2B2AE3D27D4EB4F,
+        0x165667B19E3779F9,
+        0x27D4EB2F165667C5,
+    )
+    _HALVE = bytes(i >> 1 for i in range(256))
+
+    def __init__(self, capacity):
+        width = 1 << max(4, (4 * capacity - 1).bit_length())
+        self._mask = width - 1
+        self._rows = [bytearray(width) for _ in self._SEEDS]
+        self._sample_size = 10 * width
+        self._additions = 0
+
+    def _indexes(self, key):
+        h = hash(key)
+        return [
+            (((h * seed) & 0xFFFFFFFFFFFFFFFF) >> 32) & self._mask
+            for seed in self._SEEDS
+        ]
+
+    def add(self, key):
+        for row, idx in zip(self._rows, self._indexes(key)):
+            if row[idx] < 15:
+                row[idx] += 1
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            for row in self._rows:
+                row[:] = row.translate(self._HALVE)
+            self._additions //= 2
+
+    def estimate(self, key):
+        return min(row[idx] for row, idx in zip(self._rows, self._indexes(key)))
+
+
+class TinyLFUCache(Base):
+    """Window TinyLFU Cache.
+
+    New items enter a small LRU window. Items leaving the
+    window are only admitted into the main cache if they are
+    estimated to be used more often than the main cache's
+    eviction victim, so bursts of one-off keys cannot flush
+    popular items. The main cache is a segmented LRU made of a
+    probation and a protected segment.
+
+    Attributes:
+        capacity (int): Maximum capacity of the cache.
+        callback (callable, optional): Callable defining
+        behaviour when an item is evicted from the cache.
+        Defaults to None.
+        window (float): Share of the capacity used by the
+        window. Defaults to 0.01.
+        protected (float): Share of the main cache used by the
+        protected segment. Defaults to 0.8.
+        max_weight (int, optional): Maximum total weight of
+        the cache. Defaults to None.
+        weigher (callable, optional): Callable returning the
+        weight of a value. Defaults to None.
+        item_weight (int, optional): Expected weight of an item.
+        Required when `capacity` is None, the segments and the
+        frequency sketch are then sized for `max_weight //
+        item_weight` items.
+    """
+
+    def __init__(
+        self,
+        capacity,
+        callback=None,
+        window=0.01,
+        protected=0.8,
+        max_weight=None,
+        weigher=None,
+        item_weight=None,
+    ):
+        Base.__init__(self, capacity, callback, max_weight, weigher)
+
+        if capacity is None:
+            if max_weight is None or not item_weight:
+                raise ValueError(
+                    "TinyLFUCache needs a capacity, or a max_weight and an "
+                    "item_weight to size its segments"
+                )
+            entries = max(1, max_weight // item_weight)
+        else:
+            entries = capacity
+        self._window_capacity = max(1, int(entries * window))
+        self._main_capacity = max(1, entries - self._window_capacity)
+        self._protected_capacity = max(1, int(self._main_capacity * protected))
+
+        # Segments in LRU order, the least-recently used key first.
+        self._window = OrderedDict()
+        self._probation = OrderedDict()
+        self._protected = OrderedDict()
+
+        self._sketch = _CountMinSketch(entries)
+
+    def _segment(self, _key):
+        for segment in (self._window, self._probation, self._protected):
+            if _key in segment:
+                return segment
+        raise KeyError(_key)
+
+    def _main_victim(self):
+        segment = self._probation or self._protected
+        return next(iter(segment)), segment
+
+    def __getitem__(self, _key):
+        """Retrieves item from the cache.
+
+        Records the access in the frequency sketch. Items hit
+        while on probation are promoted to the protected segment,
+        which demotes its least-recently used item if full.
+
+        Args:
+            _key (hashable): Key.
+        """
+        _value = Base.__getitem__(self, _key)
+        self._sketch.add(_key)
+
+        segment = self._segment(_key)
+        if segment is self._probation:
+            del self._probation[_key]
+            self._protected[_key] = None
+            if len(self._protected) > self._protected_capacity:
+                demoted, _ = self._protected.popitem(last=False)
+                self._probation[demoted] = None
+        else:
+            segment.move_to_end(_key)
+        return _value
+
+    def __setitem__(self, _key, _value):
+        """Add item to the cache.
+
+        New items enter the window, overflowing window items
+        move on to probation while the main cache has room.
+
+        Args:
+            _key (hashable): Item Key.
+            _value (object): Item Value.
+        """
+        self._sketch.add(_key)
+        Base.__setitem__(self, _key, _value)
+        try:
+            self._segment(_key).move_to_end(_key)
+        except KeyError:
+            self._window[_key] = None
+
+        while (
+            len(self._window) > self._window_capacity
+            and len(self._probation) + len(self._protected) < self._main_capacity
+        ):
+            candidate, _ = self._window.popitem(last=False)
+            self._probation[candidate] = None
+
+    def __delitem__(self, _key):
+        Base.__delitem__(self, _key)
+        del self._segment(_key)[_key]
+
+    def _victim(self):
+        """Select the item to evict.
+
+        Once the window is full, its least-recently used item
+        competes with the main cache's victim and the less
+        frequently used one loses. The winner is admitted to
+        probation.
+        """
+        if not (self._probation or self._protected):
+            if not self._window:
+                raise KeyError("cache is empty")
+            return next(iter(self._window))
+        if len(self._window) < self._window_capacity:
+            return self._main_victim()[0]
+
+        candidate = next(iter(self._window))
+        victim, segment = self._main_victim()
+        if self._sketch.estimate(candidate) > self._sketch.estimate(victim):
+            del self._window[candidate]
+            self._probation[candidate] = None
+            return victim
+        return candidate
+
+    def popitem(self):
+        """Force eviction of the item selected by the admission policy."""
+        try:
+            _key = self._victim()
+        except KeyError:
+            raise KeyError("cannot pop from empty cache") from None
+        _value = self._links[_key].value
+        del self[_key]
+        return (_key, _value)
+
     def _evict(self):
-        """Handle evictions when Cache exceeds capacity.
-        Not time-related.
+        """Evict the item selected by the admission policy.
+
+        If a callback function is specified, the callback
+        function is invoked.
+        """
+        try:
+            _key, _value = self.popitem()
+        except KeyError:
+            raise KeyError("cannot evict from empty cache") from None
+        else:
+            self.stats.evictions += 1
+            if self._callback:
+                self._callback(_key, _value)
+
+
+class StripedCache(MutableMapping):
+    """Thread-safe cache partitioned into independently locked stripes.
+
+    Every key is assigned to one stripe by its hash. Each stripe
+    is a regular cache guarded by its own lock, so concurrent
+    operations only contend when their keys share a stripe.
+    Capacity and weight budgets are split evenly between stripes.
+
+    Attributes:
+        capacity (int): Maximum capacity of the whole cache. None
+        for no limit on the number of items.
+        stripes (int): Number of stripes. Defaults to 16.
+        cache (type): Cache class of each stripe. Defaults to
+        `LRUCache`.
+        max_weight (int, optional): Maximum total weight of the
+        whole cache. Defaults to None.
+        **kwargs: Further keyword arguments for each stripe,
+        e.g. `ttl` for `TTLCache`.
+    """
+
+    __singleton = object()
 
-        Invokes callback function whenever an item is evicted.
+    def __init__(self, capacity, stripes=16, cache=LRUCache, max_weight=None, **kwargs):
+        if capacity is not None:
+            capacity = -(-capacity // stripes)
+        if max_weight is not None:
+            max_weight //= stripes
 
+        self._stripes = tuple(
+            cache(capacity, max_weight=max_weight, **kwargs) for _ in range(stripes)
+        )
+        self._locks = tuple(threading.Lock() for _ in range(stripes))
+
+    def _stripe(self, _key):
+        idx = hash(_key) % len(self._stripes)
+        return self._stripes[idx], self._locks[idx]
+
+    @property
+    def weight(self):
+        """Total weight of the items in the cache."""
+        return sum(stripe.weight for stripe in self._stripes)
+
+    @property
+    def stats(self):
+        """Statistics of all stripes combined."""
+        return CacheStats.merge(stripe.stats for stripe in self._stripes)
+
+    def __getitem__(self, _key):
+        stripe, lock = self._stripe(_key)
+        with lock:
+            return stripe[_key]
+
+    def get(self, _key, _default=None):
+        stripe, lock = self._stripe(_key)
+        with lock:
+            return stripe.get(_key, _default)
+
+    def __setitem__(self, _key, _value):
+        stripe, lock = self._stripe(_key)
+        with lock:
+            stripe[_key] = _value
+
+    def set(self, _key, _value, ttl=None):
+        """Add item to the cache, with its own time-to-live if
+        the stripes are `TTLCache`s."""
+        stripe, lock = self._stripe(_key)
+        with lock:
+            if ttl is None:
+                stripe[_key] = _value
+            else:
+                stripe.set(_key, _value, ttl)
+
+    def hot_items(self, limit=None):
+        """Most-recently used items of all stripes, taken from
+        the stripes in turn. Requires `TTLCache` stripes.
+
+        Args:
+            limit (int, optional): Maximum number of items.
+
+        Returns:
+            list: `(key, value, remaining ttl)` tuples.
         """
-        # Fetch and Evict LRU Item from LRUCache
-        _key, _value = LRUCache.popitem(self)
+        per_stripe = []
+        for stripe, lock in zip(self._stripes, self._locks):
+            with lock:
+                per_stripe.append(stripe.hot_items(limit))
+        items = [
+            itm
+            for rank in itertools.zip_longest(*per_stripe)
+            for itm in rank
+            if itm is not None
+        ]
+        return items if limit is None else items[:limit]
 
-        # Remove References to Link
-        link = self._links[_key]
-        self._list.remove(link)
-        del self._links[_key]
+    def __delitem__(self, _key):
+        stripe, lock = self._stripe(_key)
+        with lock:
+            del stripe[_key]
 
-        if self._callback:
-            self._callback(_key, _value)
+    def pop(self, _key, default=__singleton):
+        stripe, lock = self._stripe(_key)
+        with lock:
+            if default is self.__singleton:
+                return stripe.pop(_key)
+            return stripe.pop(_key, default)
+
+    def __contains__(self, _key):
+        stripe, lock = self._stripe(_key)
+        with lock:
+            return _key in stripe
+
+    def __iter__(self):
+        keys = []
+        for stripe, lock in zip(self._stripes, self._locks):
+            with lock:
+                keys.extend(stripe)
+        return iter(keys)
+
+    def __len__(self):
+        count = 0
+        for stripe, lock in zip(self._stripes, self._locks):
+            with lock:
+                count += len(stripe)
+        return count
+
+    def __repr__(self):
+        return "{}({} stripes)".format(self.__class__.__name__, len(self._stripes))
+
+
+class _Call:
+    """In-flight call of a `SingleFlight`."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one.
+
+    The first caller for a key runs the function, callers
+    arriving while it runs wait for and share its result.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self, _key):
+        """Whether a call for `_key` is currently running."""
+        with self._lock:
+            return _key in self._calls
+
+    def do(self, _key, func):
+        """Run `func` once for all concurrent callers of `_key`.
+
+        Args:
+            _key (hashable): Call Key.
+            func (callable): Called without arguments.
+
+        Returns:
+            object: Result of `func`. Exceptions raised by
+            `func` are re-raised in every waiting caller.
+        """
+        with self._lock:
+            call = self._calls.get(_key)
+            leader = call is None
+            if leader:
+                call = self._calls[_key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[_key]
+            call.done.set()
+        return call.value
+
+
+_Entry = namedtuple("_Entry", "value fresh_until")
+
+
+class TieredCache:
+    """Two-tier cache with an in-memory L1 in front of a `RedisCache` L2.
+
+    Reads check L1, then L2, then fall back to a loader. L2 hits
+    are promoted into L1 and new values are written through to
+    both tiers, each tier applying its own TTL: the L1 TTL is the
+    one of the in-memory cache, the L2 TTL is `l2_ttl`.
+
+    Concurrent loads of the same key are coalesced into a single
+    loader call. If `fresh_ttl` is set, L1 entries older than
+    `fresh_ttl` are stale: they are still served until the L1
+    cache expires them, while one background refresh reloads them.
+
+    Attributes:
+        l1 (MutableMapping): In-memory cache, e.g. a `TTLCache`
+        or `StripedCache`.
+        l2 (RedisCache): Persistent cache shared between processes.
+        l2_ttl (int, optional): Expiry of L2 entries in seconds.
+        Defaults to None (no expiry).
+        prefix (str): Prefix of L2 keys. Defaults to "tiered:".
+        fresh_ttl (int, optional): Seconds an L1 entry is served
+        without a refresh. Should be shorter than the L1 TTL.
+        Defaults to None (never stale).
+        refresh_workers (int): Threads running background
+        refreshes. Defaults to 4.
+        negative_ttl (int, optional): Expiry of `NEGATIVE` entries
+        in seconds, in both tiers. Requires an L1 whose `set`
+        accepts a TTL. Defaults to None (same as other entries).
+        time (callable): Callable time function used by the cache.
+        stats (CacheStats): Hits and misses across both tiers,
+        counting `NEGATIVE` hits and loads separately as well.
+
+    Loaders signal that a result does not exist by returning
+    `NEGATIVE`. It is cached like any other value, for
+    `negative_ttl` seconds in both tiers if set, and returned to
+    callers as is, so repeated lookups of missing results do not
+    reach the backend until it expires.
+
+    The hottest L1 entries can be written to an Arrow IPC file
+    with `save` and brought back after a restart with `restore`.
+    Restoring only memory-maps the file and indexes the keys;
+    an entry is decoded and promoted into L1 on its first miss.
+    """
+
+    __singleton = object()
+
+    def __init__(
+        self,
+        l1,
+        l2,
+        l2_ttl=None,
+        prefix="tiered:",
+        fresh_ttl=None,
+        refresh_workers=4,
+        negative_ttl=None,
+        _time=time.monotonic,
+    ):
+        self.l1 = l1
+        self.l2 = l2
+        self.l2_ttl = l2_ttl
+        self.prefix = prefix
+        self.fresh_ttl = fresh_ttl
+        self.negative_ttl = negative_ttl
+        self._time = _time
+        self.stats = CacheStats()
+        self._flights = SingleFlight()
+        self._refresh_workers = refresh_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+        # Memory-mapped snapshot and its row index by key.
+        self._snapshot = None
+        self._snapshot_rows = {}
+
+    def _l2_key(self, _key):
+        return f"{self.prefix}{_key}"
+
+    def _set_l1(self, _key, _value):
+        if _value is NEGATIVE and self.negative_ttl is not None:
+            # Never stale, it just expires.
+            self.l1.set(_key, _Entry(_value, float("inf")), self.negative_ttl)
+            return
+        if self.fresh_ttl is None:
+            fresh_until = float("inf")
+        else:
+            fresh_until = self._time() + self.fresh_ttl
+        try:
+            self.l1[_key] = _Entry(_value, fresh_until)
+        except ValueError:
+            # Value exceeds the L1 weight budget, keep it in L2 only.
+            pass
+
+    def _refresh(self, _key, loader):
+        """Reload a stale item in the background, once at a time."""
+        if self._flights.in_flight(_key):
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self._refresh_workers, thread_name_prefix="tiered-refresh"
+                )
+
+        def run():
+            try:
+                self.load(_key, loader)
+            except Exception:
+                # Keep serving the stale item until it expires.
+                pass
+
+        self._executor.submit(run)
+
+    def lookup(self, _key, loader=None, default=None):
+        """Retrieve an item from L1 or L2 without loading it.
+
+        Args:
+            _key (hashable): Item Key.
+            loader (callable, optional): Used to refresh the item
+            in the background if it is stale.
+            default (object, optional): Returned on a miss.
+        """
+        entry = self.l1.get(_key, self.__singleton)
+        if entry is not self.__singleton:
+            if loader is not None and entry.fresh_until <= self._time():
+                self._refresh(_key, loader)
+            return self._hit(entry.value)
+
+        if self._snapshot_rows:
+            _value = self._from_snapshot(_key)
+            if _value is not self.__singleton:
+                return self._hit(_value)
+
+        try:
+            _value = self.l2.get(self._l2_key(_key))
+        except redis.RedisError:
+            _value = None
+        if _value is not None:
+            self._set_l1(_key, _value)
+            return self._hit(_value)
+        self.stats.misses += 1
+        return default
+
+    def _hit(self, _value):
+        self.stats.hits += 1
+        if _value is NEGATIVE:
+            self.stats.negative_hits += 1
+        return _value
+
+    def _from_snapshot(self, _key):
+        """Decode a restored entry and promote it into L1."""
+        with self._lock:
+            row = self._snapshot_rows.pop(_key, None)
+            snapshot = self._snapshot
+        if row is None:
+            return self.__singleton
+
+        now = time.time()
+        ttl = snapshot.column("expires_at")[row].as_py() - now
+        if ttl <= 0:
+            return self.__singleton
+        _value = self.l2.decode(snapshot.column("payload")[row].as_py())
+        fresh_until = self._time() + (snapshot.column("fresh_at")[row].as_py() - now)
+        try:
+            self.l1.set(_key, _Entry(_value, fresh_until), ttl)
+        except ValueError:
+            pass
+        return _value
+
+    def save(self, path, limit=None):
+        """Write the hottest L1 entries and their remaining TTLs
+        to an Arrow IPC file.
+
+        Requires an L1 providing `hot_items`, i.e. a `TTLCache`
+        or a `StripedCache` of them.
+
+        Args:
+            path (str): Snapshot file, replaced atomically.
+            limit (int, optional): Maximum number of entries.
+
+        Returns:
+            int: Number of entries written.
+        """
+        if pa is None:
+            raise ImportError("pyarrow is required for cache snapshots")
+
+        now, mono = time.time(), self._time()
+        columns = {"key": [], "expires_at": [], "fresh_at": [], "payload": []}
+        for _key, entry, ttl in self.l1.hot_items(limit):
+            try:
+                payload = self.l2.encode(entry.value)
+                key = self.l2.encode(_key)
+            except (TypeError, ValueError):
+                continue
+            columns["key"].append(key)
+            columns["expires_at"].append(now + ttl)
+            columns["fresh_at"].append(now + (entry.fresh_until - mono))
+            columns["payload"].append(payload)
+
+        table = pa.table(
+            {
+                "key": pa.array(columns["key"], pa.binary()),
+                "expires_at": pa.array(columns["expires_at"], pa.float64()),
+                "fresh_at": pa.array(columns["fresh_at"], pa.float64()),
+                "payload": pa.array(columns["payload"], pa.large_binary()),
+            }
+        )
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # A file of our own, processes sharing `path` may save at once.
+        fd, tmp = tempfile.mkstemp(dir=directory or ".", suffix=".tmp")
+        os.close(fd)
+        try:
+            with pa.OSFile(tmp, "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return table.num_rows
+
+    def restore(self, path):
+        """Lazily load a snapshot written by `save`.
+
+        Args:
+            path (str): Snapshot file.
+
+        Returns:
+            int: Number of entries available from the snapshot.
+        """
+        if pa is None or not os.path.exists(path):
+            return 0
+        snapshot = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        rows = {}
+        for row, key in enumerate(snapshot.column("key").to_pylist()):
+            try:
+                rows[self.l2.decode(key)] = row
+            except (TypeError, ValueError):
+                # Unhashable, or written by a different codec.
+                continue
+        with self._lock:
+            self._snapshot = snapshot
+            self._snapshot_rows = rows
+        return len(rows)
+
+    def load(self, _key, loader):
+        """Load an item and write it through to both tiers.
+
+        Concurrent loads of the same key share a single call
+        of `loader`.
+        """
+
+        def fill():
+            _value = loader()
+            if _value is NEGATIVE:
+                self.stats.negative_misses += 1
+            self.set(_key, _value)
+            return _value
+
+        return self._flights.do(_key, fill)
+
+    def get(self, _key, loader=None, default=None):
+        """Retrieve an item from the first tier holding it.
+
+        Args:
+            _key (hashable): Item Key.
+            loader (callable, optional): Called without arguments
+            to compute the value when neither tier holds the key.
+            The result is written through to both tiers.
+            default (object, optional): Returned on a miss when no
+            loader is given. Defaults to None.
+        """
+        _value = self.lookup(_key, loader, self.__singleton)
+        if _value is not self.__singleton:
+            return _value
+        if loader is None:
+            return default
+        return self.load(_key, loader)
+
+    def get_many(self, keys, loader=None):
+        """Retrieve several items, loading the missing ones together.
+
+        L1 misses are read from L2 in a single round trip and the
+        remaining misses are passed to a single `loader` call.
+        Unlike `get`, loads are not coalesced with concurrent
+        callers and stale items are not refreshed in the background.
+
+        Args:
+            keys (list): Item Keys.
+            loader (callable, optional): Called with the list of
+            missing keys, returns a dict of values by key. Keys it
+            leaves out are not cached.
+
+        Returns:
+            dict: Values by key, None for keys nobody could provide.
+        """
+        results = {}
+        missing = []
+        for _key in keys:
+            entry = self.l1.get(_key, self.__singleton)
+            if entry is not self.__singleton:
+                results[_key] = self._hit(entry.value)
+                continue
+            _value = self.__singleton
+            if self._snapshot_rows:
+                _value = self._from_snapshot(_key)
+            if _value is not self.__singleton:
+                results[_key] = self._hit(_value)
+            else:
+                missing.append(_key)
+
+        if missing:
+            try:
+                values = self.l2.get_many([self._l2_key(_key) for _key in missing])
+            except redis.RedisError:
+                values = [None] * len(missing)
+            unloaded = []
+            for _key, _value in zip(missing, values):
+                if _value is None:
+                    self.stats.misses += 1
+                    unloaded.append(_key)
+                else:
+                    self._set_l1(_key, _value)
+                    results[_key] = self._hit(_value)
+            missing = unloaded
+
+        if missing and loader is not None:
+            loaded = loader(missing)
+            self.set_many(loaded)
+            self.stats.negative_misses += sum(
+                _value is NEGATIVE for _value in loaded.values()
+            )
+            results.update(loaded)
+        return {_key: results.get(_key) for _key in keys}
+
+    def set_many(self, mapping):
+        """Write several items through to both tiers, with one
+        round trip per L2 expiry."""
+        by_expire = {}
+        self.stats.sets += len(mapping)
+        for _key, _value in mapping.items():
+            self._set_l1(_key, _value)
+            expire = self.l2_ttl
+            if _value is NEGATIVE and self.negative_ttl is not None:
+                expire = self.negative_ttl
+            by_expire.setdefault(expire, {})[self._l2_key(_key)] = _value
+        try:
+            for expire, values in by_expire.items():
+                self.l2.set_many(values, expire=expire)
+        except redis.RedisError:
+            pass
+
+    def set(self, _key, _value):
+        """Write an item through to both tiers."""
+        self.stats.sets += 1
+        self._set_l1(_key, _value)
+        expire = self.l2_ttl
+        if _value is NEGATIVE and self.negative_ttl is not None:
+            expire = self.negative_ttl
+        try:
+            self.l2.set(
+                self._l2_key(_key),
+                _value,
+                expire=expire,
+                nx=False,
+            )
+        except redis.RedisError:
+            pass
+
+    def delete(self, _key):
+        """Remove an item from both tiers."""
+        self.l1.pop(_key, None)
+        try:
+            self.l2.delete(self._l2_key(_key))
+        except redis.RedisError:
+            pass
+
+
+class SearchKey(namedtuple("SearchKey", "kind term start end sort")):
+    """Canonical cache key of a search.
+
+    Attributes:
+        kind (str): Search type, e.g. "Hashtag" or "Tweets".
+        term (str): Normalized search term.
+        start (datetime, optional): Start of the time window.
+        end (datetime, optional): End of the time window.
+        sort (str, optional): Requested sort order.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def make(cls, kind, term, start=None, end=None, sort=None):
+        """Build a key, normalizing the search term.
+
+        Whitespace is collapsed and a leading '#' is dropped from
+        hashtags. Case is kept since the backends match on it.
+        """
+        term = " ".join(str(term).split())
+        if kind == "Hashtag":
+            term = term.lstrip("#")
+        return cls(kind, term, start, end, sort)
+
+    @property
+    def scope(self):
+        """The key without its time window."""
+        return self._replace(start=None, end=None)
+
+    def covers(self, other):
+        """Whether this key's window contains the window of `other`."""
+        return (
+            self.start is not None
+            and other.start is not None
+            and self.start <= other.start
+            and other.end <= self.end
+        )
 
-    @expire(_time=time.monotonic)
     def __str__(self):
-        return Base.__repr__(self)
+        return "|".join(
+            "" if field is None else getattr(field, "isoformat", field.__str__)()
+            for field in self
+        )
 
-    def popitem(self):
-        """Evict the LRU item."""
-        # Fetch and Evict LRU Item from LRUCache
-        _key, _value = LRUCache.popitem(self)
 
-        # Remove References to Link
-        link = self._links[_key]
-        self._list.remove(link)
-        del self._links[_key]
+class RangeCache:
+    """Cache of time-windowed search results.
 
-    # Enable 'expire' decorator to be accessed
-    # outside of the scope of the class, while
-    # still being inside the class namespace.
-    expire = staticmethod(expire)
+    Results are stored under their `SearchKey`. A lookup that
+    misses is answered from a cached result of the same search
+    whose window covers the requested one, by filtering its rows
+    on `column`, and the filtered result is cached under the
+    requested key.
+
+    Attributes:
+        cache (MutableMapping): Underlying cache, e.g. a
+        `StripedCache`. Results over its weight budget are not
+        cached.
+        column (str): Timestamp column of the results. Defaults
+        to "created_at".
+        time_format (str): Format of timestamps stored as strings,
+        compared the same way the backends compare them.
+        max_windows (int): Windows remembered per search.
+        Defaults to 16.
+        max_searches (int): Searches whose windows are remembered,
+        the least recently stored are forgotten. Defaults to 1024.
+        rows (callable, optional): Rows of a result as a DataFrame.
+        Defaults to the result itself.
+        wrap (callable, optional): Builds a result from filtered
+        rows. Defaults to the rows themselves.
+    """
+
+    def __init__(
+        self,
+        cache,
+        column="created_at",
+        time_format="%Y-%m-%d %H:%M:%S+00:00",
+        max_windows=16,
+        max_searches=1024,
+        rows=None,
+        wrap=None,
+    ):
+        self.cache = cache
+        self.column = column
+        self.time_format = time_format
+        self.max_windows = max_windows
+        self.max_searches = max_searches
+        self.rows = rows or (lambda _value: _value)
+        self.wrap = wrap or (lambda df: df)
+
+        # Keys of cached results by `SearchKey.scope`, the most
+        # recently stored key and scope last.
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def within(self, df, _key):
+        """Rows of `df` inside the window of `_key`."""
+        col = df[self.column]
+        if pd.api.types.is_datetime64_any_dtype(col):
+            lo, hi = pd.Timestamp(_key.start), pd.Timestamp(_key.end)
+            if col.dt.tz is not None:
+                lo, hi = lo.tz_localize(col.dt.tz), hi.tz_localize(col.dt.tz)
+        else:
+            lo = _key.start.strftime(self.time_format)
+            hi = _key.end.strftime(self.time_format)
+        return df[(col >= lo) & (col <= hi)].reset_index(drop=True)
+
+    def get(self, _key, loader=None, default=None):
+        """Retrieve the result of a search.
+
+        Args:
+            _key (SearchKey): Search key.
+            loader (callable, optional): Runs the search when no
+            cached result can answer it.
+            default (object, optional): Returned on a miss when no
+            loader is given.
+        """
+        _value = self.cache.get(_key)
+        if _value is not None:
+            return _value
+
+        if _key.start is not None:
+            with self._lock:
+                candidates = list(self._windows.get(_key.scope, ()))
+            for wider in reversed(candidates):
+                if wider == _key or not wider.covers(_key):
+                    continue
+                _value = self.cache.get(wider)
+                if _value is None:
+                    self._forget(wider)
+                    continue
+                _value = self.wrap(self.within(self.rows(_value), _key))
+                self.set(_key, _value)
+                return _value
+
+        if loader is None:
+            return default
+        _value = loader()
+        self.set(_key, _value)
+        return _value
+
+    def set(self, _key, _value):
+        """Store the result of a search."""
+        try:
+            self.cache[_key] = _value
+        except ValueError:
+            # Over the whole weight budget, served uncached.
+            return
+        if _key.start is None:
+            return
+        with self._lock:
+            keys = self._windows.setdefault(_key.scope, [])
+            self._windows.move_to_end(_key.scope)
+            if _key in keys:
+                keys.remove(_key)
+            keys.append(_key)
+            del keys[: -self.max_windows]
+            while len(self._windows) > self.max_searches:
+                self._windows.popitem(last=False)
+
+    def _forget(self, _key):
+        with self._lock:
+            keys = self._windows.get(_key.scope, [])
+            if _key in keys:
+                keys.remove(_key)
@@ -0,0 +1,2 @@
+# cache_test.py is a demo script that sleeps at import, not a test module.
+collect_ignore = ["cache_test.py"]
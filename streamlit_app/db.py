@@ -0,0 +1,201 @@
+import contextlib
+import threading
+import time
+
+from collections import deque, namedtuple
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+__all__ = (
+    "PostgresPool",
+    "PoolTimeout",
+    "Statement",
+)
+
+
+class PoolTimeout(psycopg2.pool.PoolError):
+    """No connection became available in time."""
+
+
+class Statement(namedtuple("Statement", "name sql types")):
+    """Server-side prepared statement.
+
+    Attributes:
+        name (str): Statement name, unique per pool.
+        sql (str): Query with `$1`, `$2`, ... placeholders.
+        types (tuple): Postgres types of the parameters,
+        e.g. `("text",)`.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, name, sql, types=()):
+        return super().__new__(cls, name, sql, tuple(types))
+
+
+class _Connection(psycopg2.extensions.connection):
+    """Connection remembering its prepared statements."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+class PostgresPool:
+    """Thread-safe pool of Postgres connections.
+
+    At most `maxconn` connections are open. Callers wait up to
+    `timeout` seconds for one to be released before `PoolTimeout`
+    is raised. Connections idle for more than `check_after`
+    seconds are checked with a trivial query before being handed
+    out, and connections that fail are discarded and replaced.
+    Connections run in autocommit mode, so an idle pooled
+    connection never holds a transaction open.
+
+    Attributes:
+        maxconn (int): Maximum number of connections. Defaults to 8.
+        timeout (float): Seconds to wait for a connection.
+        Defaults to 5.
+        check_after (float): Idle seconds after which a connection
+        is checked before use. Defaults to 30.
+        **dsn: Connection parameters, e.g. `host`, `dbname`,
+        `connect_timeout`.
+    """
+
+    def __init__(
+        self,
+        maxconn=8,
+        timeout=5.0,
+        check_after=30.0,
+        _connect=psycopg2.connect,
+        _time=time.monotonic,
+        **dsn,
+    ):
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_after = check_after
+        self._connect = _connect
+        self._time = _time
+        self._dsn = dsn
+
+        self._idle = deque()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _open(self):
+        conn = self._connect(connection_factory=_Connection, **self._dsn)
+        conn.autocommit = True
+        conn.last_used = self._time()
+        return conn
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        if self._time() - conn.last_used < self.check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"no connection available after {self.timeout}s")
+        try:
+            while True:
+                with self._lock:
+                    if self._closed:
+                        raise psycopg2.pool.PoolError("connection pool is closed")
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    return self._open()
+                if self._healthy(conn):
+                    return conn
+                self._discard(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, conn, broken=False):
+        try:
+            if broken or conn.closed:
+                self._discard(conn)
+                return
+            conn.last_used = self._time()
+            with self._lock:
+                if not self._closed:
+                    self._idle.append(conn)
+                    return
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _discard(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a `with` block."""
+        conn = self._acquire()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self._release(conn, broken)
+
+    def _execute(self, cur, statement, params):
+        conn = cur.connection
+        if statement.name not in conn.prepared:
+            types = f" ({', '.join(statement.types)})" if statement.types else ""
+            cur.execute(f"PREPARE {statement.name}{types} AS {statement.sql}")
+            conn.prepared.add(statement.name)
+        if params:
+            placeholders = ", ".join(["%s"] * len(params))
+            cur.execute(f"EXECUTE {statement.name} ({placeholders})", params)
+        else:
+            cur.execute(f"EXECUTE {statement.name}")
+
+    def fetchall(self, statement, params=()):
+        """Run a prepared statement and fetch every row.
+
+        The statement is prepared once per connection, on first use.
+
+        Args:
+            statement (Statement): Statement to run.
+            params (tuple): Parameter values.
+
+        Returns:
+            list: Rows as tuples.
+        """
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                self._execute(cur, statement, params)
+                return cur.fetchall()
+
+    def fetchone(self, statement, params=()):
+        """Run a prepared statement and fetch its first row, or None."""
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                self._execute(cur, statement, params)
+                return cur.fetchone()
+
+    def close(self):
+        """Close every idle connection and refuse new borrowers.
+        Borrowed connections are closed when returned."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+        for conn in idle:
+            self._discard(conn)
@@ -0,0 +1,1096 @@
+import bisect
+import functools
+import itertools
+import math
+import re
+import threading
+
+from array import array
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+__all__ = (
+    "TextIndex",
+    "HashtagIndex",
+    "SegmentedIndex",
+    "RowStore",
+    "UserIndex",
+    "tokenize",
+    "normalize_hashtag",
+    "normalize_username",
+    "parse_query",
+)
+
+_TOKEN = re.compile(r"\w+")
+_QUERY = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def tokenize(text):
+    """Split a text into lowercase word tokens.
+
+    Hashtag and mention markers are dropped, so "#Covid19"
+    and "covid19" are the same term.
+
+    Args:
+        text (str): Text to split.
+
+    Returns:
+        list: Tokens in order of appearance.
+    """
+    if not isinstance(text, str):
+        return []
+    return _TOKEN.findall(text.lower())
+
+
+def parse_query(query):
+    """Parse a full-text query.
+
+    Words and "quoted phrases" are ANDed together, the `OR`
+    keyword separates alternatives. A word the tokenizer splits,
+    e.g. "covid-19", is matched as a phrase.
+
+    Args:
+        query (str): Query text.
+
+    Returns:
+        list: Alternatives, each a list of phrases, each a tuple
+        of terms.
+    """
+    clauses = [[]]
+    for phrase, word in _QUERY.findall(query):
+        if word == "OR":
+            clauses.append([])
+            continue
+        terms = tuple(tokenize(phrase or word))
+        if terms:
+            clauses[-1].append(terms)
+    return [clause for clause in clauses if clause]
+
+
+def _write_varint(buf, number):
+    while number >= 0x80:
+        buf.append((number & 0x7F) | 0x80)
+        number >>= 7
+    buf.append(number)
+
+
+def _read_varints(buf):
+    """Decode a sequence of varints into an array."""
+    data = np.frombuffer(buf, dtype=np.uint8)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    shifts = 7 * (np.arange(len(data)) - np.repeat(starts, ends - starts + 1))
+    return np.add.reduceat((data & 0x7F).astype(np.int64) << shifts, starts)
+
+
+# Decoded postings of a term: sorted document ids, term
+# frequencies and the positions of the term in every document,
+# those of `docs[i]` being `positions[starts[i]:starts[i + 1]]`.
+_Postings = namedtuple("_Postings", "docs tfs starts positions")
+
+_NO_POSTINGS = _Postings(*(np.zeros(n, dtype=np.int64) for n in (0, 0, 1, 0)))
+
+
+def _decode(buf):
+    """Decode the compressed postings of a term, see `TextIndex`."""
+    numbers = _read_varints(buf)
+    # Only finding where documents start is sequential, every
+    # document is followed by its term frequency and positions.
+    heads = []
+    values = numbers.tolist()
+    i = 0
+    while i < len(values):
+        heads.append(i)
+        i += 2 + values[i + 1]
+    heads = np.array(heads, dtype=np.int64)
+
+    docs = np.cumsum(numbers[heads])
+    tfs = numbers[heads + 1]
+    starts = np.zeros(len(docs) + 1, dtype=np.int64)
+    np.cumsum(tfs, out=starts[1:])
+    gaps = np.delete(numbers, np.concatenate((heads, heads + 1)))
+    positions = np.cumsum(gaps)
+    firsts = starts[:-1]
+    positions -= np.repeat(positions[firsts] - gaps[firsts], tfs)
+    return _Postings(docs, tfs, starts, positions)
+
+
+def _stamp(value):
+    """Nanoseconds since the epoch of a time, UTC if naive."""
+    stamp = pd.Timestamp(value)
+    if stamp.tzinfo is None:
+        stamp = stamp.tz_localize("UTC")
+    return stamp.value
+
+
+class _Rows:
+    """Append-only rows of an index, concatenated on demand."""
+
+    def __init__(self):
+        self._frames = []
+        self._frame = None
+
+    def append(self, rows):
+        self._frames.append(rows.reset_index(drop=True))
+        self._frame = None
+
+    def frame(self):
+        if self._frame is None:
+            self._frame = (
+                _combine_chunks(pd.concat(self._frames, ignore_index=True))
+                if self._frames
+                else pd.DataFrame()
+            )
+            self._frames = [self._frame]
+        return self._frame
+
+
+def _combine_chunks(frame):
+    """Merge the chunks of Arrow-backed columns of a concatenated
+    frame. Taking rows from a chunked column merges it every time."""
+    for name, dtype in frame.dtypes.items():
+        if getattr(dtype, "storage", None) != "pyarrow" and not isinstance(
+            dtype, pd.ArrowDtype
+        ):
+            continue
+        chunked = frame[name].array.__arrow_array__()
+        if getattr(chunked, "num_chunks", 1) > 1:
+            frame[name] = pd.array(chunked.combine_chunks(), dtype=dtype)
+    return frame
+
+
+class TextIndex:
+    """In-memory inverted index of tweets with BM25 ranking.
+
+    Postings lists are stored compressed: for every document
+    containing a term, the gap to the previous document id, the
+    term frequency and the gaps between the term positions, all
+    as varints. Documents only ever get appended, so postings
+    are extended in place and never re-encoded.
+
+    Searches decode the postings of their terms into numpy arrays
+    outside the lock. Those of a compacted index never change, so
+    the arrays of recently searched terms are kept.
+
+    Searches return the indexed rows of matching documents with
+    an extra `score` column, best match first.
+
+    Attributes:
+        column (str): Text column. Defaults to "text".
+        id_column (str): Column identifying documents, rows
+        with an already indexed id are skipped. Defaults to "id".
+        time_column (str): Timestamp column used by time windows.
+        Defaults to "created_at".
+        time_format (str): Format of timestamps stored as strings.
+        k1 (float): BM25 term frequency saturation. Defaults to 1.2.
+        b (float): BM25 length normalization. Defaults to 0.75.
+        stored_columns (list, optional): Columns of the documents
+        kept in `docs`, with at least the timestamp column.
+        Defaults to all.
+        cached_terms (int): Number of terms whose decoded postings
+        a compacted index keeps. Defaults to 256.
+    """
+
+    def __init__(
+        self,
+        column="text",
+        id_column="id",
+        time_column="created_at",
+        time_format="%Y-%m-%d %H:%M:%S+00:00",
+        k1=1.2,
+        b=0.75,
+        stored_columns=None,
+        cached_terms=256,
+    ):
+        self.column = column
+        self.id_column = id_column
+        self.time_column = time_column
+        self.time_format = time_format
+        self.k1 = k1
+        self.b = b
+        self.stored_columns = stored_columns
+        self.cached_terms = cached_terms
+
+        # Compressed postings, last document id and document
+        # frequency by term.
+        self._postings = {}
+        self._last_doc = {}
+        self._df = {}
+        # Token count by document id.
+        self._lengths = array("I")
+        self._total_length = 0
+        self._ids = set()
+        # Decoded postings by term, least recently used first.
+        self._decoded = OrderedDict()
+
+        self._rows = _Rows()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def add(self, rows):
+        """Index a batch of documents.
+
+        Args:
+            rows (pd.DataFrame): Documents, at least with the
+            text and id columns.
+
+        Returns:
+            int: Number of documents added.
+        """
+        if rows.empty:
+            return 0
+        rows = rows.drop_duplicates(subset=self.id_column)
+        with self._lock:
+            if self._ids is None:
+                raise ValueError("cannot add to a compacted index")
+            rows = rows[~rows[self.id_column].isin(self._ids)]
+            doc = len(self._lengths)
+            for text in rows[self.column]:
+                self._index(doc, tokenize(text))
+                doc += 1
+            self._ids.update(rows[self.id_column])
+            self._rows.append(
+                rows if self.stored_columns is None else rows[self.stored_columns]
+            )
+        return len(rows)
+
+    def _index(self, doc, tokens):
+        positions = {}
+        for pos, token in enumerate(tokens):
+            positions.setdefault(token, []).append(pos)
+
+        for token, offsets in positions.items():
+            buf = self._postings.get(token)
+            if buf is None:
+                buf = self._postings[token] = bytearray()
+                self._df[token] = 0
+                _write_varint(buf, doc)
+            else:
+                _write_varint(buf, doc - self._last_doc[token])
+            _write_varint(buf, len(offsets))
+            last = 0
+            for pos in offsets:
+                _write_varint(buf, pos - last)
+                last = pos
+            self._last_doc[token] = doc
+            self._df[token] += 1
+
+        self._lengths.append(len(tokens))
+        self._total_length += len(tokens)
+
+    def postings(self, term):
+        """Decode the postings of a term.
+
+        Returns:
+            dict: Positions of the term by document id.
+        """
+        found = self._decode([term])[term]
+        bounds = found.starts.tolist()
+        positions = found.positions.tolist()
+        return {
+            doc: positions[bounds[i] : bounds[i + 1]]
+            for i, doc in enumerate(found.docs.tolist())
+        }
+
+    def _decode(self, terms):
+        """Decoded postings of terms, by term.
+
+        Only copying the compressed postings of an index still
+        growing needs the lock.
+        """
+        found, bufs = {}, {}
+        with self._lock:
+            compacted = self._ids is None
+            for term in terms:
+                if term in self._decoded:
+                    self._decoded.move_to_end(term)
+                    found[term] = self._decoded[term]
+                    continue
+                buf = self._postings.get(term)
+                bufs[term] = buf if compacted or buf is None else bytes(buf)
+
+        for term, buf in bufs.items():
+            found[term] = _NO_POSTINGS if buf is None else _decode(buf)
+        if compacted and bufs:
+            with self._lock:
+                for term in bufs:
+                    self._decoded[term] = found[term]
+                while len(self._decoded) > self.cached_terms:
+                    self._decoded.popitem(last=False)
+        return found
+
+    @property
+    def docs(self):
+        """Indexed documents as a single DataFrame."""
+        with self._lock:
+            return self._rows.frame()
+
+    def stats(self, terms):
+        """Corpus statistics BM25 scores depend on.
+
+        Returns:
+            tuple: Number of documents, total number of tokens and
+            document frequency of each of `terms`.
+        """
+        with self._lock:
+            dfs = {term: self._df.get(term, 0) for term in terms}
+            return len(self._lengths), self._total_length, dfs
+
+    def compact(self):
+        """Shrink the index once no more documents will be added.
+
+        Postings become immutable bytes, trimmed to their length,
+        the document lengths an array, the rows a single DataFrame,
+        and the state only used while adding documents is dropped.
+        Adding documents afterwards raises ValueError.
+        """
+        with self._lock:
+            self._postings = {term: bytes(buf) for term, buf in self._postings.items()}
+            self._lengths = np.array(self._lengths)
+            self._last_doc = None
+            self._ids = None
+            self._rows.frame()
+
+    @staticmethod
+    def _match(phrase, postings):
+        """Sorted documents containing all terms of a phrase, in order."""
+        docs = functools.reduce(
+            np.intersect1d, (postings[term].docs for term in phrase)
+        )
+        if len(phrase) == 1 or not len(docs):
+            return docs
+        # Positions the phrase could start at, as `doc << 32 | start`.
+        starts = None
+        for i, term in enumerate(phrase):
+            found = postings[term]
+            at = np.searchsorted(found.docs, docs)
+            counts = found.tfs[at]
+            ends = np.cumsum(counts)
+            first = np.repeat(found.starts[at] - ends + counts, counts)
+            offsets = found.positions[first + np.arange(ends[-1])]
+            keys = np.repeat(docs, counts) << 32 | (offsets - i)
+            keys = keys[offsets >= i]
+            if starts is not None:
+                keys = np.intersect1d(starts, keys, assume_unique=True)
+            starts = keys
+        return np.unique(starts >> 32)
+
+    def search(self, query, start=None, end=None, limit=None, corpus=None):
+        """Run a full-text query.
+
+        Args:
+            query (str): Query, see `parse_query`.
+            start (datetime, optional): Start of the time window.
+            end (datetime, optional): End of the time window.
+            limit (int, optional): Maximum number of results.
+            corpus (tuple, optional): Statistics to score with
+            instead of this index's, see `stats`, e.g. those of a
+            whole collection this index is a part of.
+
+        Returns:
+            pd.DataFrame: Matching documents and their `score`,
+            best match first.
+        """
+        docs, scores = self.matches(query, start, end, limit, corpus)
+        return self.docs.iloc[docs].assign(score=scores).reset_index(drop=True)
+
+    def matches(self, query, start=None, end=None, limit=None, corpus=None):
+        """Documents matching a query, without building their rows.
+
+        Takes the arguments of `search`.
+
+        Returns:
+            tuple: Positions of the matching documents in `docs`,
+            best match first, and their scores, as numpy arrays.
+        """
+        clauses = parse_query(query)
+        terms = {term for clause in clauses for phrase in clause for term in phrase}
+        postings = self._decode(terms)
+        with self._lock:
+            if corpus is None:
+                corpus = len(self._lengths), self._total_length, None
+            # Lengths of a growing index are copied, a view would
+            # keep them from being appended to.
+            lengths = self._lengths if self._ids is None else np.array(self._lengths)
+        count, total_length, dfs = corpus
+        avg_length = total_length / count if count else 0.0
+
+        matches = np.empty(0, dtype=np.int64)
+        for clause in clauses:
+            docs = functools.reduce(
+                np.intersect1d, (self._match(phrase, postings) for phrase in clause)
+            )
+            matches = np.union1d(matches, docs)
+        if not len(matches):
+            return matches, np.empty(0, dtype=float)
+
+        scores = np.zeros(len(matches))
+        for term, found in postings.items():
+            if not len(found.docs):
+                continue
+            df = len(found.docs) if dfs is None else dfs[term]
+            idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            at = np.minimum(np.searchsorted(found.docs, matches), len(found.docs) - 1)
+            hit = found.docs[at] == matches
+            tfs = found.tfs[at[hit]]
+            norm = self.k1 * (1 - self.b + self.b * lengths[matches[hit]] / avg_length)
+            scores[hit] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+        order = np.argsort(-scores, kind="stable")
+        ranked, scores = matches[order], scores[order]
+        if start is not None and end is not None:
+            inside = self._within(ranked, start, end)
+            ranked, scores = ranked[inside], scores[inside]
+        if limit is not None:
+            ranked, scores = ranked[:limit], scores[:limit]
+        return ranked, scores
+
+    def _within(self, docs, start, end):
+        """Mask of the documents inside the window `[start, end]`."""
+        col = self.docs[self.time_column].iloc[docs]
+        if pd.api.types.is_datetime64_any_dtype(col):
+            lo, hi = pd.Timestamp(start), pd.Timestamp(end)
+            if col.dt.tz is not None:
+                lo, hi = lo.tz_localize(col.dt.tz), hi.tz_localize(col.dt.tz)
+        else:
+            lo = start.strftime(self.time_format)
+            hi = end.strftime(self.time_format)
+        return ((col >= lo) & (col <= hi)).to_numpy(dtype=bool)
+
+
+_HASHTAG = re.compile(r"\w+")
+
+
+def normalize_hashtag(tag):
+    """Case-folded hashtag without its leading '#'."""
+    return tag.strip().lstrip("#").casefold()
+
+
+class HashtagIndex:
+    """In-memory index of tweets by hashtag.
+
+    Every normalized hashtag maps to the ids of the tweets using
+    it, sorted by `created_at`, so a time window is a binary
+    search on the postings rather than a filter on the results.
+    Hashtags are kept in a sorted list for prefix matches.
+
+    Postings are appended as tweets are added and sorted once
+    on the first search that reads them.
+
+    Attributes:
+        column (str): Hashtags column, either lists of hashtags
+        or their string representation, e.g. "['covid', 'nyc']".
+        Defaults to "hashtags".
+        id_column (str): Column identifying tweets, rows with an
+        already indexed id are skipped. Defaults to "id".
+        time_column (str): Timestamp column. Defaults to
+        "created_at".
+        stored_columns (list, optional): Columns of the tweets
+        kept in `docs`. Defaults to all.
+    """
+
+    def __init__(
+        self,
+        column="hashtags",
+        id_column="id",
+        time_column="created_at",
+        stored_columns=None,
+    ):
+        self.column = column
+        self.id_column = id_column
+        self.time_column = time_column
+        self.stored_columns = stored_columns
+
+        # Unsorted `(timestamps, doc ids)` appended since the last
+        # search, and sorted numpy postings, by hashtag.
+        self._pending = {}
+        self._postings = {}
+        self._tags = []
+        self._ids = set()
+        self._count = 0
+
+        self._rows = _Rows()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    @staticmethod
+    def hashtags(value):
+        """Normalized hashtags of a hashtags column value."""
+        if isinstance(value, (list, tuple)):
+            value = " ".join(map(str, value))
+        if not isinstance(value, str):
+            return set()
+        return {normalize_hashtag(tag) for tag in _HASHTAG.findall(value)}
+
+    def add(self, rows):
+        """Index a batch of tweets.
+
+        Args:
+            rows (pd.DataFrame): Tweets, at least with the hashtags,
+            id and timestamp columns.
+
+        Returns:
+            int: Number of tweets added.
+        """
+        if rows.empty:
+            return 0
+        rows = rows.drop_duplicates(subset=self.id_column)
+        tags = rows[self.column].map(self.hashtags)
+        with self._lock:
+            if self._ids is None:
+                raise ValueError("cannot add to a compacted index")
+            keep = ~rows[self.id_column].isin(self._ids) & tags.map(bool)
+            rows, tags = rows[keep], tags[keep]
+            stamps = pd.to_datetime(rows[self.time_column], utc=True)
+            stamps = stamps.to_numpy(dtype="datetime64[ns]").view("int64")
+
+            doc = self._count
+            for doc_tags, stamp in zip(tags, stamps):
+                for tag in doc_tags:
+                    pending = self._pending.get(tag)
+                    if pending is None:
+                        pending = self._pending[tag] = (array("q"), array("q"))
+                    pending[0].append(stamp)
+                    pending[1].append(doc)
+                doc += 1
+
+            self._ids.update(rows[self.id_column])
+            self._rows.append(
+                rows if self.stored_columns is None else rows[self.stored_columns]
+            )
+            self._count = doc
+            self._tags = None
+        return len(rows)
+
+    def compact(self):
+        """Sort every posting and concatenate the rows once no more
+        tweets will be added. Adding tweets afterwards raises
+        ValueError."""
+        with self._lock:
+            for tag in list(self._pending):
+                self._sorted(tag)
+            self._ids = None
+            self._rows.frame()
+
+    def _sorted(self, tag):
+        """Sorted postings of a hashtag, merging pending ones."""
+        pending = self._pending.pop(tag, None)
+        postings = self._postings.get(tag)
+        if pending is None:
+            return postings
+
+        stamps = np.frombuffer(pending[0], dtype=np.int64)
+        docs = np.frombuffer(pending[1], dtype=np.int64)
+        if postings is not None:
+            stamps = np.concatenate((postings[0], stamps))
+            docs = np.concatenate((postings[1], docs))
+        order = np.argsort(stamps, kind="stable")
+        postings = self._postings[tag] = (stamps[order], docs[order])
+        return postings
+
+    def _match(self, tag, prefix):
+        if self._tags is None:
+            self._tags = sorted(self._postings.keys() | self._pending.keys())
+        if not prefix:
+            return [tag] if tag in self._postings or tag in self._pending else []
+        lo = bisect.bisect_left(self._tags, tag)
+        hi = bisect.bisect_left(self._tags, tag + "\U0010ffff")
+        return self._tags[lo:hi]
+
+    @property
+    def docs(self):
+        """Indexed tweets as a single DataFrame."""
+        with self._lock:
+            return self._rows.frame()
+
+    def search(self, hashtag, start=None, end=None, prefix=False, limit=None):
+        """Tweets using a hashtag, oldest first.
+
+        Args:
+            hashtag (str): Hashtag, with or without '#', any case.
+            start (datetime, optional): Start of the time window,
+            UTC if naive.
+            end (datetime, optional): End of the time window.
+            prefix (bool): Match every hashtag starting with
+            `hashtag`. Defaults to False.
+            limit (int, optional): Maximum number of tweets.
+
+        Returns:
+            pd.DataFrame: Indexed rows of the matching tweets.
+        """
+        docs = self.matches(hashtag, start, end, prefix, limit)
+        return self.docs.iloc[docs].reset_index(drop=True)
+
+    def matches(self, hashtag, start=None, end=None, prefix=False, limit=None):
+        """Tweets using a hashtag, without building their rows.
+
+        Takes the arguments of `search`.
+
+        Returns:
+            np.ndarray: Positions of the tweets in `docs`, oldest
+            first.
+        """
+        tag = normalize_hashtag(hashtag)
+        lo = None if start is None else _stamp(start)
+        hi = None if end is None else _stamp(end)
+
+        stamps, docs = [], []
+        with self._lock:
+            for match in self._match(tag, prefix):
+                tag_stamps, tag_docs = self._sorted(match)
+                first = 0 if lo is None else np.searchsorted(tag_stamps, lo, "left")
+                last = (
+                    len(tag_stamps)
+                    if hi is None
+                    else np.searchsorted(tag_stamps, hi, "right")
+                )
+                stamps.append(tag_stamps[first:last])
+                docs.append(tag_docs[first:last])
+
+        if not docs:
+            return np.empty(0, dtype=np.int64)
+        if len(docs) == 1:
+            docs = docs[0]
+        else:
+            # A tweet may use several of the matched hashtags.
+            stamps, docs = np.concatenate(stamps), np.concatenate(docs)
+            docs, first = np.unique(docs, return_index=True)
+            docs = docs[np.argsort(stamps[first], kind="stable")]
+        if limit is not None:
+            docs = docs[:limit]
+        return docs
+
+
+class RowStore:
+    """Append-only rows of one or more `SegmentedIndex`es.
+
+    Indexes of different columns of the same tweets share a store,
+    so every row is kept once however many indexes search it.
+
+    Attributes:
+        id_column (str): Column identifying rows, rows with an
+        already stored id are skipped. Defaults to "id".
+    """
+
+    def __init__(self, id_column="id"):
+        self.id_column = id_column
+
+        self._ids = set()
+        self._count = 0
+        self._rows = _Rows()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def add(self, rows):
+        """Store a batch of rows.
+
+        Args:
+            rows (pd.DataFrame): Rows, at least with the id column.
+
+        Returns:
+            tuple: The rows stored, those with a new id, and the
+            position of the first of them in `frame`.
+        """
+        rows = rows.drop_duplicates(subset=self.id_column)
+        with self._lock:
+            rows = rows[~rows[self.id_column].isin(self._ids)].reset_index(drop=True)
+            start = self._count
+            self._ids.update(rows[self.id_column])
+            self._rows.append(rows)
+            self._count += len(rows)
+        return rows, start
+
+    def frame(self):
+        """Stored rows as a single DataFrame."""
+        with self._lock:
+            return self._rows.frame()
+
+
+# Column of the segments' rows holding the position of the row in
+# the rows of their `SegmentedIndex`.
+_ROW = "_row"
+
+
+class _Segment:
+    """Index of the rows of one time bucket, and the first and
+    last timestamps it holds, in nanoseconds."""
+
+    __slots__ = ("index", "bucket", "first", "last", "sealed", "_rows")
+
+    def __init__(self, index, bucket):
+        self.index = index
+        self.bucket = bucket
+        self.first = None
+        self.last = None
+        self.sealed = False
+        self._rows = None
+
+    def rows(self, docs):
+        """Positions in the segmented index of segment documents."""
+        if self._rows is None or len(self._rows) < len(self.index):
+            self._rows = self.index.docs[_ROW].to_numpy(dtype=np.int64)
+        return self._rows[docs]
+
+
+class SegmentedIndex:
+    """Index of tweets split into segments by time bucket.
+
+    Rows are routed to the segment of the bucket their timestamp
+    falls in, e.g. their day, and every segment keeps the first
+    and last timestamp it holds. Searches only run on segments
+    overlapping the time window, and only check the window on
+    the rows of segments partly outside it, so a search costs in
+    proportion to the part of the collection its window covers.
+
+    Segments keep only the ids, timestamps and positions of their
+    rows, the rows are kept once in a `RowStore`, which indexes of
+    other columns may share, and built once per search.
+
+    Complete segments are sealed, see `seal`: their index is
+    compacted and takes no more rows. Rows of a sealed bucket
+    open another segment for it.
+
+    Results are merged in time order, or best match first when
+    the segments are scored, e.g. `TextIndex` segments, which are
+    then scored with statistics of the whole collection.
+
+    Attributes:
+        factory (callable): Creates the index of a segment, e.g.
+        `TextIndex`. Indexes have a `column`, an `id_column` and
+        a `time_column`, and `matches` and `docs` like `TextIndex`.
+        freq (str): Bucket size, as a pandas frequency. Defaults
+        to "D", daily.
+        store (RowStore, optional): Store of the rows, shared with
+        other indexes. Defaults to a store of this index's own.
+    """
+
+    def __init__(self, factory, freq="D", store=None):
+        self.factory = factory
+        self.freq = freq
+        index = factory()
+        self.column = index.column
+        self.id_column = index.id_column
+        self.time_column = index.time_column
+        self._scored = hasattr(index, "stats")
+        self.store = RowStore(self.id_column) if store is None else store
+
+        # Segments in bucket order, their buckets for bisection, and
+        # the segment of rows without a timestamp.
+        self._segments = []
+        self._buckets = []
+        self._undated = None
+        self._count = 0
+
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def docs(self):
+        """Indexed rows as a single DataFrame."""
+        return self.store.frame()
+
+    @property
+    def segments(self):
+        """Segments in time order, undated rows last."""
+        with self._lock:
+            segments = list(self._segments)
+            if self._undated is not None:
+                segments.append(self._undated)
+            return segments
+
+    def _index(self):
+        index = self.factory()
+        index.stored_columns = [self.id_column, self.time_column, _ROW]
+        return index
+
+    def _segment(self, bucket):
+        """Open segment of a bucket, None for undated rows."""
+        if bucket is None:
+            if self._undated is None:
+                self._undated = _Segment(self._index(), None)
+            return self._undated
+        hi = bisect.bisect_right(self._buckets, bucket)
+        if hi and self._buckets[hi - 1] == bucket:
+            segment = self._segments[hi - 1]
+            if not segment.sealed:
+                return segment
+        segment = _Segment(self._index(), bucket)
+        self._segments.insert(hi, segment)
+        self._buckets.insert(hi, bucket)
+        return segment
+
+    def add(self, rows, start=None):
+        """Index a batch of tweets.
+
+        Args:
+            rows (pd.DataFrame): Tweets, at least with the columns
+            of the segment indexes.
+            start (int, optional): Rows already added to `store`
+            are indexed with the position of the first of them,
+            as returned by `RowStore.add`. By default the rows
+            are added to `store` here.
+
+        Returns:
+            int: Number of tweets added.
+        """
+        if start is None:
+            rows, start = self.store.add(rows)
+        if rows.empty:
+            return 0
+        with self._lock:
+            self._count += len(rows)
+
+        columns = list(dict.fromkeys((self.id_column, self.time_column, self.column)))
+        slim = rows[columns].assign(**{_ROW: np.arange(start, start + len(rows))})
+        stamps = pd.to_datetime(slim[self.time_column], utc=True, errors="coerce")
+        buckets = stamps.dt.floor(self.freq)
+        for bucket, group in slim.groupby(buckets, sort=False, dropna=False):
+            with self._lock:
+                segment = self._segment(None if pd.isna(bucket) else bucket.value)
+            segment.index.add(group)
+            if segment.bucket is None:
+                continue
+            group_stamps = stamps[group.index]
+            first, last = group_stamps.min().value, group_stamps.max().value
+            with self._lock:
+                if segment.first is None or first < segment.first:
+                    segment.first = first
+                if segment.last is None or last > segment.last:
+                    segment.last = last
+        return len(rows)
+
+    def seal(self, before=None):
+        """Seal and compact the segments of complete buckets.
+
+        Args:
+            before (datetime, optional): Seal the buckets starting
+            before this time, UTC if naive. Defaults to every
+            bucket but the latest.
+        """
+        with self._lock:
+            if before is None:
+                hi = len(self._buckets) - 1
+            else:
+                hi = bisect.bisect_left(self._buckets, _stamp(before))
+            segments = [s for s in self._segments[: max(hi, 0)] if not s.sealed]
+            for segment in segments:
+                segment.sealed = True
+        for segment in segments:
+            segment.index.compact()
+
+    def _overlapping(self, lo, hi):
+        """Segments holding rows inside the window `[lo, hi]`."""
+        with self._lock:
+            first = 0
+            if lo is not None:
+                # Buckets are at most `freq` long, those starting
+                # before the bucket of `lo` end before `lo`.
+                lo_bucket = pd.Timestamp(lo, tz="UTC").floor(self.freq).value
+                first = bisect.bisect_left(self._buckets, lo_bucket)
+            last = len(self._buckets)
+            if hi is not None:
+                last = bisect.bisect_right(self._buckets, hi)
+            segments = self._segments[first:last]
+            if lo is None and hi is None and self._undated is not None:
+                segments.append(self._undated)
+        return [
+            segment
+            for segment in segments
+            if segment.bucket is None
+            or (
+                segment.first is not None
+                and (lo is None or segment.last >= lo)
+                and (hi is None or segment.first <= hi)
+            )
+        ]
+
+    def _corpus(self, query):
+        """Statistics of all segments, see `TextIndex.stats`."""
+        terms = {
+            term for clause in parse_query(query) for phrase in clause for term in phrase
+        }
+        count = total_length = 0
+        dfs = dict.fromkeys(terms, 0)
+        for segment in self.segments:
+            seg_count, seg_length, seg_dfs = segment.index.stats(terms)
+            count += seg_count
+            total_length += seg_length
+            for term, df in seg_dfs.items():
+                dfs[term] += df
+        return count, total_length, dfs
+
+    def search(self, query, start=None, end=None, limit=None, **kwargs):
+        """Search the segments overlapping a time window.
+
+        Args:
+            query (str): Query of the segments' `search`.
+            start (datetime, optional): Start of the time window,
+            UTC if naive.
+            end (datetime, optional): End of the time window.
+            limit (int, optional): Maximum number of results.
+            **kwargs: Other arguments of the segments' `search`,
+            e.g. `prefix`.
+
+        Returns:
+            pd.DataFrame: Matching rows, oldest segment first, or
+            best match first with a `score` column.
+        """
+        lo = None if start is None else _stamp(start)
+        hi = None if end is None else _stamp(end)
+        if self._scored:
+            # Scores comparable across segments, as if unsegmented.
+            kwargs["corpus"] = self._corpus(query)
+
+        rows, scores, found = [], [], 0
+        for segment in self._overlapping(lo, hi):
+            inside = (
+                segment.bucket is not None
+                and (lo is None or segment.first >= lo)
+                and (hi is None or segment.last <= hi)
+            )
+            window = (None, None) if inside else (start, end)
+            matches = segment.index.matches(
+                query, start=window[0], end=window[1], limit=limit, **kwargs
+            )
+            if self._scored:
+                docs, doc_scores = matches
+                scores.append(doc_scores)
+            else:
+                docs = matches
+            rows.append(segment.rows(docs))
+            found += len(docs)
+            if not self._scored and limit is not None and found >= limit:
+                break
+
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        if self._scored:
+            scores = np.concatenate(scores) if scores else np.empty(0, dtype=float)
+            order = np.argsort(-scores, kind="stable")
+            rows, scores = rows[order], scores[order]
+        if limit is not None:
+            rows, scores = rows[:limit], scores[:limit]
+        # Slicing, unlike taking no rows, is free on any frame.
+        results = self.docs.iloc[rows] if len(rows) else self.docs.iloc[0:0]
+        if self._scored:
+            results = results.assign(score=scores)
+        return results.reset_index(drop=True)
+
+
+def normalize_username(name):
+    """Case-insensitive form of a name, whitespace collapsed."""
+    return " ".join(str(name).split()).casefold()
+
+
+class UserIndex:
+    """In-memory index of user ids by name and screen name.
+
+    Resolves a username without a database round trip, and
+    answers names nobody uses without one either. Exact matches
+    rank first, then case-insensitive ones, then names starting
+    with the username. Normalized names are kept in a sorted list
+    for prefix matches.
+
+    Attributes:
+        columns (tuple): Name columns, in order of precedence.
+        Defaults to ("name", "screen_name").
+        id_column (str): Column identifying users. Defaults to "id".
+    """
+
+    def __init__(self, columns=("name", "screen_name"), id_column="id"):
+        self.columns = tuple(columns)
+        self.id_column = id_column
+
+        # Ids by exact name, per column, and by normalized name.
+        self._exact = {column: {} for column in self.columns}
+        self._normalized = {}
+        self._names = []
+        self._ids = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, rows):
+        """Index a batch of users.
+
+        Args:
+            rows (pd.DataFrame): Users, at least with the id and
+            name columns.
+
+        Returns:
+            int: Number of users added.
+        """
+        if rows.empty:
+            return 0
+        rows = rows.drop_duplicates(subset=self.id_column)
+        ids = rows[self.id_column].tolist()
+        names = [rows[column].tolist() for column in self.columns]
+        added = 0
+        with self._lock:
+            for i, _id in enumerate(ids):
+                if _id in self._ids:
+                    continue
+                for column, column_names in zip(self.columns, names):
+                    name = column_names[i]
+                    if not isinstance(name, str) or not name.strip():
+                        continue
+                    self._exact[column].setdefault(name, []).append(_id)
+                    self._normalized.setdefault(normalize_username(name), []).append(
+                        _id
+                    )
+                self._ids.add(_id)
+                added += 1
+            self._names = None
+        return added
+
+    def _prefixed(self, name):
+        if self._names is None:
+            self._names = sorted(self._normalized)
+        lo = bisect.bisect_left(self._names, name)
+        hi = bisect.bisect_left(self._names, name + "\U0010ffff")
+        for match in self._names[lo:hi]:
+            yield from self._normalized[match]
+
+    def resolve(self, username, prefix=True, limit=None):
+        """Ids of the users matching a username, best match first.
+
+        Args:
+            username (str): Name or screen name, any case.
+            prefix (bool): Also match names starting with
+            `username`. Defaults to True.
+            limit (int, optional): Maximum number of ids.
+
+        Returns:
+            list: Matching user ids, empty if there are none.
+        """
+        username = " ".join(str(username).split())
+        name = normalize_username(username)
+        if not name:
+            return []
+        with self._lock:
+            matches = [
+                self._exact[column].get(username, ()) for column in self.columns
+            ]
+            matches.append(self._normalized.get(name, ()))
+            if prefix:
+                matches.append(self._prefixed(name))
+            ids = []
+            seen = set()
+            for _id in itertools.chain.from_iterable(matches):
+                if _id in seen:
+                    continue
+                seen.add(_id)
+                ids.append(_id)
+                if limit is not None and len(ids) >= limit:
+                    break
+        return ids
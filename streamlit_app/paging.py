@@ -0,0 +1,315 @@
+import json
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+__all__ = (
+    "Cursor",
+    "Page",
+    "SortedFrame",
+    "keyset_clause",
+    "order_clause",
+    "page_rows",
+    "page_frame",
+)
+
+
+class Cursor(namedtuple("Cursor", "value id")):
+    """Position of a row in `(sort key, id)` order.
+
+    Attributes:
+        value (object): Sort key of the row.
+        id (object): Id of the row, breaking ties between equal
+        sort keys.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def of(cls, row, column, id_column="id"):
+        """Cursor of a DataFrame row."""
+        value, _id = row[column], row[id_column]
+        if pd.isna(value):
+            # NaN and NaT alike, rows without a sort key.
+            value = None
+        # numpy scalars to plain Python, so they can be rendered in queries.
+        elif hasattr(value, "item"):
+            value = value.item()
+        if hasattr(_id, "item"):
+            _id = _id.item()
+        return cls(value, _id)
+
+
+class Page(namedtuple("Page", "rows next prev total exact")):
+    """One page of search results.
+
+    Attributes:
+        rows (pd.DataFrame): Rows of the page, in sort order.
+        next (Cursor, optional): Cursor to fetch the following
+        page with, None on the last page.
+        prev (Cursor, optional): Cursor to fetch the preceding
+        page with, None on the first page.
+        total (int, optional): Number of matches, None if not
+        counted.
+        exact (bool): Whether `total` is exact rather than a
+        lower bound.
+    """
+
+    __slots__ = ()
+
+
+def keyset_clause(column, descending, cursor, backward=False, alias="tweets"):
+    """N1QL condition keeping the rows past `cursor`.
+
+    Args:
+        column (str): Sort column.
+        descending (bool): Whether pages are sorted descending.
+        cursor (Cursor, optional): Last row of the previous page,
+        or first row of the next page if `backward`.
+        backward (bool): Fetch the page before `cursor`.
+        alias (str): Alias of the queried collection.
+
+    Rows without a value, NULL or MISSING, come after every row
+    with one, ordered by id, as `SortedFrame` orders them.
+
+    Returns:
+        str: "AND ..." condition, empty without a cursor.
+    """
+    if cursor is None:
+        return ""
+    op = "<" if descending != backward else ">"
+    col, id_col = f"{alias}.{column}", f"{alias}.id"
+    _id = json.dumps(cursor.id)
+    if cursor.value is None:
+        unvalued = f"({col} IS NOT VALUED AND {id_col} {op} {_id})"
+        if backward:
+            return f"AND ({col} IS VALUED OR {unvalued})"
+        return f"AND {unvalued}"
+    value = json.dumps(cursor.value)
+    past = f"{col} {op} {value} OR ({col} = {value} AND {id_col} {op} {_id})"
+    if backward:
+        return f"AND ({past})"
+    return f"AND ({past} OR {col} IS NOT VALUED)"
+
+
+def order_clause(column, descending, backward=False, alias="tweets"):
+    """N1QL ordering matching `keyset_clause`.
+
+    Backward pages are scanned in reverse order, `page_rows`
+    restores the sort order.
+    """
+    direction = "DESC" if descending != backward else "ASC"
+    nulls = "NULLS FIRST" if backward else "NULLS LAST"
+    return f"{alias}.{column} {direction} {nulls}, {alias}.id {direction}"
+
+
+def page_rows(rows, column, size, cursor=None, backward=False, id_column="id"):
+    """Build a page from rows fetched past a cursor.
+
+    Args:
+        rows (pd.DataFrame): Up to `size + 1` rows in scan order,
+        the extra row telling whether another page follows.
+        column (str): Sort column.
+        size (int): Page size.
+        cursor (Cursor, optional): Cursor the rows were fetched with.
+        backward (bool): Whether the rows were fetched backward.
+        id_column (str): Id column. Defaults to "id".
+
+    Returns:
+        Page: Page without a total.
+    """
+    more = len(rows) > size
+    rows = rows.iloc[:size]
+    if backward:
+        rows = rows.iloc[::-1]
+    rows = rows.reset_index(drop=True)
+    if rows.empty:
+        return Page(rows, None, None, None, False)
+
+    first = Cursor.of(rows.iloc[0], column, id_column)
+    last = Cursor.of(rows.iloc[-1], column, id_column)
+    if backward:
+        return Page(rows, last, first if more else None, None, False)
+    return Page(rows, last if more else None, first if cursor else None, None, False)
+
+
+class SortedFrame:
+    """Search results with memoized sort orders.
+
+    Results are ordered by `(column, id)`, like `page_frame`
+    orders them. The order of a column is computed once and
+    serves both directions. Until it is, the first rows of an
+    order are picked by partial selection, in linear time, so
+    showing the top of another order never sorts all results.
+
+    Orders are memoized without locking, concurrent first uses
+    may compute one twice.
+
+    Attributes:
+        frame (pd.DataFrame): All results, in any order.
+        id_column (str): Id column. Defaults to "id".
+    """
+
+    def __init__(self, frame, id_column="id"):
+        self.frame = frame
+        self.id_column = id_column
+        self._ids = frame[id_column].to_numpy() if id_column in frame else None
+        # Non-null positions, their values or ranks, null positions
+        # and the ranked values, and the ascending order, by column.
+        self._keys = {}
+        self._orders = {}
+
+    def __len__(self):
+        return len(self.frame)
+
+    def _column(self, column):
+        keys = self._keys.get(column)
+        if keys is None:
+            values = self.frame[column]
+            valid = values.notna().to_numpy()
+            values, uniques = values[valid], None
+            if values.to_numpy().dtype == object:
+                # e.g. strings, partitioned and compared much faster
+                # as integer ranks.
+                values, uniques = pd.factorize(values, sort=True)
+                uniques = np.asarray(uniques, dtype=object)
+            else:
+                values = values.to_numpy()
+            keys = self._keys[column] = (
+                np.flatnonzero(valid),
+                values,
+                np.flatnonzero(~valid),
+                uniques,
+            )
+        return keys
+
+    def _sorted(self, positions, values, descending):
+        """`positions` ordered by their values, then their ids."""
+        by_id = np.argsort(self._ids[positions], kind="stable")
+        order = by_id[np.argsort(values[by_id], kind="stable")]
+        return positions[order[::-1] if descending else order]
+
+    def _nulls(self, nulls, descending):
+        if not len(nulls):
+            return nulls
+        # Rows without a value come last, ordered by id.
+        return self._sorted(nulls, self._ids[nulls], descending)
+
+    def order(self, column, descending):
+        """Positions of all rows in `(column, id)` order.
+
+        Returns:
+            np.ndarray: Row positions, rows without a value last.
+        """
+        valid, values, nulls, _ = self._column(column)
+        ascending = self._orders.get(column)
+        if ascending is None:
+            ascending = self._orders[column] = self._sorted(valid, values, False)
+        order = ascending[::-1] if descending else ascending
+        return np.concatenate((order, self._nulls(nulls, descending)))
+
+    def top(self, column, descending, n):
+        """Positions of the first `n` rows of an order, see `order`."""
+        valid, values, nulls, _ = self._column(column)
+        if column in self._orders or n >= len(valid):
+            return self.order(column, descending)[:n]
+        if n <= 0:
+            return valid[:0]
+        # The n-th value, then every row tied with it, since ties
+        # are ordered by id.
+        if descending:
+            kth = len(values) - n
+            nth = values[np.argpartition(values, kth)[kth]]
+            candidates = np.flatnonzero(values >= nth)
+        else:
+            kth = n - 1
+            nth = values[np.argpartition(values, kth)[kth]]
+            candidates = np.flatnonzero(values <= nth)
+        return self._sorted(valid[candidates], values[candidates], descending)[:n]
+
+    def past(self, column, cursor, descending, backward=False):
+        """Mask of the rows after `cursor` in `order`.
+
+        Rows without a value come after every row with one, a
+        cursor without a value continues among them by id.
+
+        Args:
+            column (str): Sort column.
+            cursor (Cursor): Cursor to compare rows with.
+            descending (bool): Whether the order is descending.
+            backward (bool): Mask the rows before `cursor` instead.
+
+        Returns:
+            np.ndarray: Boolean mask over all rows.
+        """
+        valid, values, nulls, uniques = self._column(column)
+        mask = np.zeros(len(self.frame), dtype=bool)
+        if pd.isna(cursor.value):
+            ids = self._ids[nulls]
+            if descending != backward:
+                mask[nulls[ids < cursor.id]] = True
+            else:
+                mask[nulls[ids > cursor.id]] = True
+            if backward:
+                mask[valid] = True
+            return mask
+
+        ids = self._ids[valid]
+        if uniques is None:
+            below, same, above = (
+                values < cursor.value,
+                values == cursor.value,
+                values > cursor.value,
+            )
+        else:
+            rank = np.searchsorted(uniques, cursor.value, "left")
+            found = rank < len(uniques) and uniques[rank] == cursor.value
+            below = values < rank
+            same = values == rank if found else np.zeros(len(values), dtype=bool)
+            above = values >= rank + found
+        if descending != backward:
+            past = below | (same & (ids < cursor.id))
+        else:
+            past = above | (same & (ids > cursor.id))
+        mask[valid[past]] = True
+        if not backward:
+            mask[nulls] = True
+        return mask
+
+
+def page_frame(
+    df, column, descending, size, cursor=None, backward=False, id_column="id"
+):
+    """Page through results already held in memory.
+
+    Args:
+        df (pd.DataFrame or SortedFrame): All results, in any
+        order. A `SortedFrame` reuses its sort orders across
+        calls.
+        column (str): Sort column.
+        descending (bool): Whether pages are sorted descending.
+        size (int): Page size.
+        cursor (Cursor, optional): See `keyset_clause`.
+        backward (bool): Fetch the page before `cursor`.
+        id_column (str): Id column. Defaults to "id".
+
+    Returns:
+        Page: Page with an exact total.
+    """
+    if not isinstance(df, SortedFrame):
+        df = SortedFrame(df, id_column)
+    if df.frame.empty:
+        return Page(df.frame, None, None, 0, True)
+    if cursor is None and not backward:
+        positions = df.top(column, descending, size + 1)
+    else:
+        order = df.order(column, descending)
+        if cursor is not None:
+            order = order[df.past(column, cursor, descending, backward)[order]]
+        positions = order[::-1][: size + 1] if backward else order[: size + 1]
+    rows = df.frame.iloc[positions]
+    return page_rows(rows, column, size, cursor, backward, id_column)._replace(
+        total=len(df), exact=True
+    )
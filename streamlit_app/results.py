@@ -0,0 +1,169 @@
+import itertools
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover
+    pa = None
+
+__all__ = (
+    "iter_chunks",
+    "iter_frames",
+    "read_frame",
+    "split_frame",
+)
+
+# Rows held as Python objects at any time while reading results.
+BATCH_SIZE = 4096
+
+
+def iter_chunks(rows, size=BATCH_SIZE):
+    """Consume query results in lists of at most `size` rows.
+
+    Args:
+        rows (iterable): Couchbase query result, DB-API cursor
+        (read with `fetchmany`) or any iterable of rows.
+        size (int): Rows per chunk.
+    """
+    fetchmany = getattr(rows, "fetchmany", None)
+    if fetchmany is not None:
+        while True:
+            chunk = fetchmany(size)
+            if not chunk:
+                return
+            yield chunk
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _names(rows, chunk, columns):
+    if columns is not None:
+        return list(columns)
+    description = getattr(rows, "description", None)
+    if description is not None:
+        return [column[0] for column in description]
+    if isinstance(chunk[0], dict):
+        # Documents may lack fields, keep every key in order of appearance.
+        return list(dict.fromkeys(key for row in chunk for key in row))
+    return None
+
+
+def _columnar(chunk, names):
+    """Turn a chunk of rows into lists of values by column."""
+    if isinstance(chunk[0], dict):
+        return {name: [row.get(name) for row in chunk] for name in names}
+    return {name: list(values) for name, values in zip(names, zip(*chunk))}
+
+
+def iter_frames(rows, size=BATCH_SIZE, columns=None):
+    """Convert query results into DataFrames of at most `size` rows.
+
+    Args:
+        rows (iterable): See `iter_chunks`. Rows are dicts, or
+        sequences named by `columns` or the cursor description.
+        size (int): Rows per DataFrame.
+        columns (list, optional): Column names. Defaults to the
+        cursor description, or the keys of the documents.
+    """
+    for batch in _iter_batches(rows, size, columns):
+        yield batch if isinstance(batch, pd.DataFrame) else _to_pandas(batch)
+
+
+def _nullable(arrow_type):
+    """Nullable pandas dtype of an Arrow integer type."""
+    name = str(arrow_type).replace("uint", "UInt").replace("int", "Int")
+    return pd.api.types.pandas_dtype(name)
+
+
+def _to_pandas(table):
+    """DataFrame of an Arrow table.
+
+    Integer columns with nulls become nullable integer columns
+    rather than floats, which would round ids past 2**53.
+    """
+    df = table.to_pandas()
+    for name, column in zip(table.column_names, table.columns):
+        if pa.types.is_integer(column.type) and column.null_count:
+            dtype = _nullable(column.type)
+            df[name] = column.to_pandas(types_mapper=lambda _: dtype).array
+    return df
+
+
+def _iter_batches(rows, size, columns):
+    """Typed chunks: Arrow tables, or DataFrames without pyarrow."""
+    names = None
+    for chunk in iter_chunks(rows, size):
+        if names is None or (columns is None and isinstance(chunk[0], dict)):
+            names = _names(rows, chunk, columns)
+        if names is None:
+            # Plain sequences without names, numbered by pandas.
+            yield pd.DataFrame(chunk)
+            continue
+        data = _columnar(chunk, names)
+        del chunk
+        if pa is None:
+            yield pd.DataFrame(data, columns=names)
+            continue
+        try:
+            yield pa.table(data)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Mixed-type columns Arrow cannot type, keep them as objects.
+            yield pd.DataFrame(data, columns=names)
+
+
+def read_frame(rows, size=BATCH_SIZE, columns=None):
+    """Read query results into a single DataFrame.
+
+    Rows are consumed `size` at a time and each chunk is turned
+    into typed columns right away, so at most one chunk of rows
+    is alive as Python objects. With pyarrow the chunks are Arrow
+    tables, converted to pandas once at the end. Integer columns
+    with nulls are nullable integers, not floats.
+
+    Args:
+        rows (iterable): See `iter_frames`.
+        size (int): Rows per chunk.
+        columns (list, optional): See `iter_frames`.
+
+    Returns:
+        pd.DataFrame: All results, empty if there are none.
+    """
+    batches = list(_iter_batches(rows, size, columns))
+    if not batches:
+        return pd.DataFrame(columns=columns)
+    if pa is not None and not any(isinstance(b, pd.DataFrame) for b in batches):
+        try:
+            table = pa.concat_tables(batches, promote_options="permissive")
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # e.g. a field typed differently across chunks.
+            pass
+        else:
+            return _to_pandas(table)
+    frames = [b if isinstance(b, pd.DataFrame) else _to_pandas(b) for b in batches]
+    return pd.concat(frames, ignore_index=True)
+
+
+def split_frame(frame, by, keys, missing=None):
+    """Split the results of a query over several keys by key.
+
+    Args:
+        frame (pd.DataFrame): Rows of all keys.
+        by (str or pd.Series): Column holding the key of every
+        row, or the keys themselves, aligned with `frame`.
+        keys (list): Keys the query was run for.
+        missing (object, optional): Value of the keys without rows.
+
+    Returns:
+        dict: Rows of every key, in the order of `frame`, or
+        `missing`, by key in the order of `keys`.
+    """
+    groups = {
+        key: rows.reset_index(drop=True)
+        for key, rows in frame.groupby(by, sort=False)
+    }
+    return {key: groups.get(key, missing) for key in keys}
@@ -0,0 +1,885 @@
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import pandas as pd
+from couchbase.auth import PasswordAuthenticator
+from couchbase.cluster import Cluster
+from couchbase.options import ClusterOptions, ClusterTimeoutOptions
+
+from index import HashtagIndex, RowStore, SegmentedIndex, TextIndex, UserIndex
+from db import PostgresPool, Statement
+from results import iter_frames, read_frame, split_frame
+from paging import (
+    Cursor,
+    Page,
+    SortedFrame,
+    keyset_clause,
+    order_clause,
+    page_frame,
+    page_rows,
+)
+from cache import (
+    TTLCache,
+    ArrowCodec,
+    JsonCodec,
+    RangeCache,
+    RedisCache,
+    RefreshAhead,
+    SearchKey,
+    StripedCache,
+    TieredCache,
+    NEGATIVE,
+    sizeof,
+)
+
+__all__ = (
+    "TWEET_FIELDS",
+    "COUNT_CAP",
+    "sort_options",
+    "sort_options_cached",
+    "inventory_scope",
+    "indexes_ready",
+    "users_ready",
+    "search_by_hashtag",
+    "search_by_text",
+    "search_by_username",
+    "get_tweets_by_users",
+    "get_retweets_by_tweets",
+    "search_page",
+    "count_matches",
+    "find_page",
+    "check_cache",
+    "check_cache_many",
+    "load_user",
+    "inmemory_cache",
+    "redis_cache",
+    "get_dashboard_metrics",
+)
+
+endpoint = "cb.u5tbreifenk4gngi.cloud.couchbase.com"
+username = "DBMS"
+password = "Dbms@123"
+bucket_name = "dbmsProject"
+scope_name = "twitter"
+collection_name = "tweets"
+
+PGHOST = "twitter.postgres.database.azure.com"
+PGUSER = "neeraj"
+PGPORT = 5432
+PGDATABASE = "postgres"
+PGPASSWORD = "Dbms@123"
+# Connections kept open to Postgres, and seconds to wait for a free one.
+PG_POOL_SIZE = int(os.environ.get("PG_POOL_SIZE", 8))
+PG_POOL_TIMEOUT = float(os.environ.get("PG_POOL_TIMEOUT", 5))
+# Seconds to wait for Postgres to accept a new connection.
+PG_CONNECT_TIMEOUT = int(os.environ.get("PG_CONNECT_TIMEOUT", 5))
+# Threads fetching user tweets while the profile is read from Postgres.
+USER_FETCH_WORKERS = int(os.environ.get("USER_FETCH_WORKERS", 8))
+
+# Memory budget of the in-memory search cache, in bytes.
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# Lifetime of in-memory search results, in seconds.
+CACHE_TTL = int(os.environ.get("CACHE_TTL", 600))
+# Extra seconds an expired result is still served while it is refreshed.
+CACHE_STALE_TTL = int(os.environ.get("CACHE_STALE_TTL", 60))
+# Lifetime of search results in Redis, in seconds.
+REDIS_CACHE_TTL = int(os.environ.get("REDIS_CACHE_TTL", 3600))
+# Lifetime of cached "not found" results, in seconds.
+CACHE_NEGATIVE_TTL = int(os.environ.get("CACHE_NEGATIVE_TTL", 60))
+CACHE_STRIPES = 8
+# Memory budget of the full index results kept with their sort orders.
+RESULTS_CACHE_MAX_BYTES = int(
+    os.environ.get("RESULTS_CACHE_MAX_BYTES", 128 * 1024 * 1024)
+)
+# Searches whose complete Couchbase results are kept until the indexes
+# are built, see `search_page`.
+FALLBACK_RESULTS_ITEMS = 1024
+# Seconds between background recomputations of each dashboard metric.
+METRICS_REFRESH_INTERVAL = {
+    "top_users": 600,
+    "top_locations": 3600,
+    "top_hashtags": 1800,
+    "top_tweets": 600,
+}
+# Seconds a request waits for metrics whose first refresh is running.
+METRICS_WAIT_TIMEOUT = 5
+# Where the hottest search results are saved for warm restarts.
+CACHE_SNAPSHOT_PATH = os.environ.get(
+    "CACHE_SNAPSHOT_PATH", os.path.join(".cache", "search_cache.arrow")
+)
+# Number of entries saved, and seconds between periodic saves.
+CACHE_SNAPSHOT_ITEMS = int(os.environ.get("CACHE_SNAPSHOT_ITEMS", 1000))
+CACHE_SNAPSHOT_INTERVAL = int(os.environ.get("CACHE_SNAPSHOT_INTERVAL", 300))
+
+# Backends are connected once per process, on import, and shared by
+# the Streamlit UI and the search API.
+authenticator = PasswordAuthenticator(username, password)
+timeout_opts = ClusterTimeoutOptions(
+    connect_timeout=timedelta(seconds=60), kv_timeout=timedelta(seconds=60)
+)
+options = ClusterOptions(authenticator=authenticator, timeout_options=timeout_opts)
+cluster = Cluster(f"couchbases://{endpoint}", options)
+cluster.wait_until_ready(timedelta(seconds=5))
+bucket = cluster.bucket(bucket_name)
+inventory_scope = bucket.scope(scope_name)
+cb_coll = inventory_scope.collection(collection_name)
+
+
+TWEET_FIELDS = """tweets.created_at, tweets.favorite_count, tweets.hashtags, tweets.id,
+    tweets.is_retweet, tweets.original_tweet_id, tweets.reply_count,
+    tweets.retweet_count, tweets.retweeted_status, tweets.text, tweets.urls, tweets.user_id"""
+# Rows fetched per batch while building the tweet indexes.
+INDEX_BATCH = 10000
+# Time span of the segments of the tweet indexes, as a pandas frequency.
+INDEX_SEGMENT = os.environ.get("INDEX_SEGMENT", "D")
+# Matches counted at most by Couchbase searches, larger totals show as "N+".
+COUNT_CAP = 10000
+
+
+sort_options = {
+    "Most Relevant": "created_at DESC",
+    "Most Recent": "created_at DESC",
+    "Least Recent": "created_at ASC",
+    "Most Favorited": "favorite_count DESC",
+    "Least Favorited": "favorite_count ASC",
+    "Most Replies": "reply_count DESC",
+    "Least Replies": "reply_count ASC",
+}
+
+sort_options_cached ={
+    "Most Relevant": ['score', False],
+    "Most Recent": ['created_at', False],
+    "Least Recent": ['created_at', True],
+    "Most Favorited": ['favorite_count', False],
+    "Least Favorited": ['favorite_count', True],
+    "Most Replies": ['reply_count', False],
+    "Least Replies": ['reply_count', True],
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_tweet_indexes():
+    """Full-text and hashtag indexes of all tweets, segmented by
+    `created_at` and built in the background. Both share one copy
+    of the tweets.
+
+    The tweets collection is a static dataset: the indexes are
+    built once per process from a full scan and never refreshed,
+    tweets written to Couchbase afterwards are only searched after
+    a restart.
+
+    Returns both indexes and an event set once they are complete.
+    """
+    store = RowStore()
+    indexes = (
+        SegmentedIndex(TextIndex, freq=INDEX_SEGMENT, store=store),
+        SegmentedIndex(HashtagIndex, freq=INDEX_SEGMENT, store=store),
+    )
+    ready = threading.Event()
+    threading.Thread(
+        target=build_tweet_indexes, args=(indexes, store, ready), daemon=True
+    ).start()
+    return indexes + (ready,)
+
+
+def build_tweet_indexes(indexes, store, ready):
+    sql_query = f"""
+    SELECT {TWEET_FIELDS}
+    FROM `{bucket_name}`.`{scope_name}`.`{collection_name}`
+    """
+
+    try:
+        rows = inventory_scope.query(sql_query)
+        for df in iter_frames(rows, size=INDEX_BATCH):
+            df, start = store.add(df)
+            for index in indexes:
+                index.add(df, start)
+        # Tweets are scanned in no particular order, every segment
+        # is complete once the scan is.
+        for index in indexes:
+            index.seal()
+        ready.set()
+    except Exception as e:
+        print("Error while building the tweet indexes: " + str(e))
+
+
+text_index, hashtag_index, indexes_ready = get_tweet_indexes()
+
+
+def search_by_hashtag(
+    hashtag,
+    start_datetime,
+    end_datetime,
+    sort_by,
+    bucket_name,
+    scope_name,
+    collection_name,
+):
+    start_time = time.time()
+
+    if indexes_ready.is_set():
+        # A trailing '*' matches every hashtag with that prefix.
+        prefix = hashtag.endswith("*")
+        df = hashtag_index.search(
+            hashtag.rstrip("*"), start_datetime, end_datetime, prefix=prefix
+        )
+        return df, len(df), time.time() - start_time
+
+    start_datetime_str = start_datetime.strftime("%Y-%m-%d %H:%M:%S+00:00")
+    end_datetime_str = end_datetime.strftime("%Y-%m-%d %H:%M:%S+00:00")
+    order_by = sort_options[sort_by]
+
+    sql_query = f"""
+    SELECT {TWEET_FIELDS}
+    FROM `{bucket_name}`.`{scope_name}`.`{collection_name}`
+    WHERE tweets.hashtags LIKE '%{hashtag}%'
+    AND tweets.created_at BETWEEN '{start_datetime_str}' AND '{end_datetime_str}'
+    ORDER BY {order_by};
+    """
+
+    try:
+        df = read_frame(inventory_scope.query(sql_query))
+        elapsed_time = time.time() - start_time
+        total_count = len(df)
+        return df, total_count, elapsed_time
+    except Exception as e:
+        print("Error during database query: " + str(e))
+        return pd.DataFrame(), 0, 0
+
+
+def search_by_text(
+    search_text,
+    start_datetime,
+    end_datetime,
+    sort_by,
+    bucket_name,
+    scope_name,
+    collection_name,
+):
+    start_time = time.time()
+
+    if indexes_ready.is_set():
+        df = text_index.search(search_text, start_datetime, end_datetime)
+        df["View Retweets"] = df["retweet_count"].apply(
+            lambda x: "View" if pd.notna(x) and x > 0 else ""
+        )
+        return df, len(df), time.time() - start_time
+
+    like_pattern = f"%{search_text}%"
+    start_datetime_str = start_datetime.strftime("%Y-%m-%d %H:%M:%S+00:00")
+    end_datetime_str = end_datetime.strftime("%Y-%m-%d %H:%M:%S+00:00")
+    order_by = sort_options[sort_by]
+
+    sql_query = f"""
+    SELECT {TWEET_FIELDS}
+    FROM `{bucket_name}`.`{scope_name}`.`{collection_name}`
+    WHERE tweets.text LIKE '{like_pattern}'
+    AND tweets.created_at BETWEEN '{start_datetime_str}' AND '{end_datetime_str}'
+    ORDER BY {order_by};
+    """
+
+    try:
+        df = read_frame(inventory_scope.query(sql_query))
+
+        df = df.drop_duplicates(subset="id")
+        df["View Retweets"] = df["retweet_count"].apply(
+            lambda x: "View" if pd.notna(x) and x > 0 else ""
+        )
+
+        elapsed_time = time.time() - start_time
+        total_count = len(df)
+
+        return df, total_count, elapsed_time
+    except Exception as e:
+        print("Error during database query: " + str(e))
+        return pd.DataFrame(), 0, 0
+
+
+@functools.lru_cache(maxsize=None)
+def get_pg_pool():
+    """Postgres connections shared by all sessions of this process."""
+    return PostgresPool(
+        maxconn=PG_POOL_SIZE,
+        timeout=PG_POOL_TIMEOUT,
+        dbname=PGDATABASE,
+        user=PGUSER,
+        password=PGPASSWORD,
+        host=PGHOST,
+        port=PGPORT,
+        connect_timeout=PG_CONNECT_TIMEOUT,
+    )
+
+
+pg_pool = get_pg_pool()
+
+USER_BY_NAME = Statement(
+    "user_by_name",
+    """SELECT id, name, screen_name, location, url, followers_count, friends_count,
+        statuses_count, verified, created_at
+    FROM users_final WHERE name = $1""",
+    ["text"],
+)
+USER_BY_ID = Statement(
+    "user_by_id",
+    """SELECT id, name, screen_name, location, url, followers_count, friends_count,
+        statuses_count, verified, created_at
+    FROM users_final WHERE id = $1""",
+    ["bigint"],
+)
+TOP_FOLLOWED_USERS = Statement(
+    "top_followed_users",
+    """SELECT name, screen_name, followers_count
+    FROM users_final
+    ORDER BY followers_count DESC
+    LIMIT 10""",
+)
+TOP_CREATOR_LOCATIONS = Statement(
+    "top_creator_locations",
+    """SELECT location, COUNT(*) AS user_count
+    FROM users_final
+    WHERE location IS NOT NULL AND location != 'MISSING_INFORMATION' AND location != 'NA'
+    GROUP BY location
+    ORDER BY user_count DESC
+    LIMIT 100""",
+)
+
+
+@functools.lru_cache(maxsize=None)
+def get_user_index():
+    """Index of user names, loaded from Postgres in the background.
+
+    Returns the index and an event set once it is complete.
+    """
+    index = UserIndex()
+    ready = threading.Event()
+    threading.Thread(
+        target=build_user_index, args=(index, ready), daemon=True
+    ).start()
+    return index, ready
+
+
+def build_user_index(index, ready):
+    try:
+        with pg_pool.connection() as conn:
+            # A named cursor streams the table from the server in
+            # batches, which needs a transaction; pooled connections
+            # autocommit.
+            conn.autocommit = False
+            try:
+                with conn.cursor(name="user_index_scan") as cur:
+                    cur.execute("SELECT id, name, screen_name FROM users_final")
+                    for df in iter_frames(cur, size=INDEX_BATCH):
+                        index.add(df)
+            finally:
+                conn.rollback()
+                conn.autocommit = True
+        ready.set()
+    except Exception as e:
+        print("Error while building the user index: " + str(e))
+
+
+user_index, users_ready = get_user_index()
+user_fetches = ThreadPoolExecutor(USER_FETCH_WORKERS, thread_name_prefix="user-fetch")
+
+
+def get_user_tweets(user_id):
+    tweet_query = f"""
+    SELECT tweets.id, tweets.text, tweets.user_id
+    FROM `{bucket_name}`.`{scope_name}`.`{collection_name}`
+    WHERE tweets.user_id = {int(user_id)};
+    """
+    df = read_frame(inventory_scope.query(tweet_query))
+    return df.drop_duplicates(subset="id")
+
+
+def search_by_username(username):
+    """Profile and tweets of the user best matching `username`.
+
+    Once the user index is loaded, the username is resolved in
+    memory, exactly or case-insensitively, else as the prefix of
+    the name or screen name of a single user, so a mistyped name
+    never shows somebody else. Unknown names are answered right
+    away.
+    The tweets are then fetched from Couchbase while the profile
+    is read from Postgres. Until then, the profile is looked up
+    by exact name before the tweets are fetched.
+
+    Query errors are raised, so they are not cached.
+
+    Returns:
+        tuple: The profile, or "User not found.", the tweets and
+        the elapsed time.
+    """
+    start_time = time.time()
+    tweets = None
+    if users_ready.is_set():
+        ids = user_index.resolve(username, prefix=False, limit=1)
+        if not ids:
+            # Only prefix matches left, use one only if it is unique.
+            ids = user_index.resolve(username, limit=2)
+        if len(ids) != 1:
+            return "User not found.", pd.DataFrame(), 0
+        tweets = user_fetches.submit(get_user_tweets, ids[0])
+        user_details = pg_pool.fetchone(USER_BY_ID, (ids[0],))
+    else:
+        user_details = pg_pool.fetchone(USER_BY_NAME, (username,))
+
+    if not user_details:
+        return "User not found.", pd.DataFrame(), 0
+
+    user_data = {
+        "ID": user_details[0],
+        "Name": user_details[1],
+        "Screen Name": user_details[2],
+        "Location": user_details[3],
+        "URL": user_details[4],
+        "Followers Count": user_details[5],
+        "Friends Count": user_details[6],
+        "Statuses Count": user_details[7],
+        "Verified": user_details[8],
+        "Created At": user_details[9],
+    }
+
+    if tweets is None:
+        df = get_user_tweets(user_data["ID"])
+    else:
+        df = tweets.result()
+    elapsed_time = time.time() - start_time
+    return user_data, df, elapsed_time
+
+
+def get_tweets_by_users(user_ids, bucket_name, scope_name, collection_name):
+    """Tweets of several users in a single query.
+
+    Returns:
+        dict: Tweets by user id, `NEGATIVE` for users without tweets.
+    """
+    ids = [int(user_id) for user_id in user_ids]
+    sql_query = f"""
+    SELECT tweets.created_at, tweets.text, tweets.user_id
+    FROM `{bucket_name}`.`{scope_name}`.`{collection_name}`
+    WHERE tweets.user_id IN {json.dumps(ids)}
+    ORDER BY tweets.created_at DESC;
+    """
+    try:
+        tweets_df = read_frame(inventory_scope.query(sql_query))
+    except Exception as e:
+        print(f"Error fetching tweets for users {ids}: {str(e)}")
+        # Not cached, the next selection retries.
+        return {}
+    if tweets_df.empty:
+        return dict.fromkeys(ids, NEGATIVE)
+    tweets_df = tweets_df.drop_duplicates(subset=["user_id", "created_at"])
+    return split_frame(tweets_df, "user_id", ids, NEGATIVE)
+
+
+def get_retweets_by_tweets(original_tweet_ids, inventory_scope):
+    """Retweets of several tweets in a single query.
+
+    Returns:
+        dict: Retweets by original tweet id, `NEGATIVE` for tweets
+        without retweets.
+    """
+    ids = [int(tweet_id) for tweet_id in original_tweet_ids]
+    query = f"""
+    SELECT t.original_tweet_id, t.created_at AS retweet_time, t.user_id,
+        t.text AS retweet_text
+    FROM `{bucket_name}`.`{scope_name}`.`{collection_name}` AS t
+    WHERE t.original_tweet_id IN {json.dumps(ids)} AND t.is_retweet = 'True';
+    """
+    try:
+        retweets_df = read_frame(inventory_scope.query(query))
+    except Exception as e:
+        print(
+            f"Failed to retrieve retweets for the original tweet IDs {ids}: {str(e)}"
+        )
+        # Not cached, the next selection retries.
+        return {}
+    if retweets_df.empty:
+        return dict.fromkeys(ids, NEGATIVE)
+    return split_frame(
+        retweets_df.drop(columns="original_tweet_id"),
+        retweets_df["original_tweet_id"],
+        ids,
+        NEGATIVE,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_search_cache():
+    """Search cache shared by all sessions of this process, backed by Redis."""
+    l1 = StripedCache(
+        None,
+        stripes=CACHE_STRIPES,
+        cache=TTLCache,
+        ttl=CACHE_TTL + CACHE_STALE_TTL,
+        max_weight=CACHE_MAX_BYTES,
+    )
+    tiered = TieredCache(
+        l1,
+        RedisCache(codecs=[ArrowCodec(), JsonCodec(types=(SearchKey, Page, Cursor))]),
+        l2_ttl=REDIS_CACHE_TTL,
+        prefix="search:",
+        fresh_ttl=CACHE_TTL,
+        negative_ttl=CACHE_NEGATIVE_TTL,
+    )
+    try:
+        tiered.restore(CACHE_SNAPSHOT_PATH)
+    except Exception as e:
+        print(f"Could not restore search cache snapshot: {e}")
+
+    def snapshot_periodically():
+        while True:
+            time.sleep(CACHE_SNAPSHOT_INTERVAL)
+            snapshot_search_cache(tiered)
+
+    atexit.register(snapshot_search_cache, tiered)
+    threading.Thread(target=snapshot_periodically, daemon=True).start()
+    return tiered
+
+
+def snapshot_search_cache(tiered):
+    """Save the hottest search results so a restart starts warm."""
+    try:
+        tiered.save(CACHE_SNAPSHOT_PATH, limit=CACHE_SNAPSHOT_ITEMS)
+    except Exception as e:
+        print(f"Could not save search cache snapshot: {e}")
+
+
+inmemory_cache = get_search_cache()
+
+
+@functools.lru_cache(maxsize=None)
+def get_results_cache():
+    """Full index results of recent searches, kept in this process
+    only, with the sort orders computed on them. Searches inside
+    the window of a cached one filter its results."""
+    # A single stripe: results of broad searches take tens of MB,
+    # every stripe would only get a fraction of the budget, and the
+    # cache is only read once per page.
+    return RangeCache(
+        StripedCache(
+            None,
+            stripes=1,
+            cache=TTLCache,
+            ttl=CACHE_TTL,
+            max_weight=RESULTS_CACHE_MAX_BYTES,
+            weigher=lambda results: sizeof(results.frame),
+        ),
+        rows=lambda results: results.frame,
+        wrap=SortedFrame,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_fallback_results():
+    """Couchbase results of recent searches that fit a single page.
+
+    Kept apart from the index results, since Couchbase matches
+    terms as substrings and the indexes match whole words.
+    """
+    return RangeCache(
+        StripedCache(
+            FALLBACK_RESULTS_ITEMS, stripes=1, cache=TTLCache, ttl=CACHE_TTL
+        ),
+        rows=lambda results: results.frame,
+        wrap=SortedFrame,
+    )
+
+
+results_cache = get_results_cache()
+fallback_results = get_fallback_results()
+
+
+def check_cache(query, loader, not_found=None):
+    """Cached result of `query`, running `loader` once on a miss.
+
+    Concurrent misses of the same query share one `loader` call,
+    and results past their fresh period are served while being
+    refreshed in the background. Loaders return `NEGATIVE` when
+    nothing was found, which is cached briefly and answered with
+    `not_found`, an empty DataFrame by default.
+    """
+    start = time.time()
+    cached_result = inmemory_cache.get(query, loader)
+    elapsed_time = time.time() - start
+
+    if cached_result is NEGATIVE:
+        cached_result = pd.DataFrame() if not_found is None else not_found
+    return cached_result, elapsed_time
+
+
+def check_cache_many(queries, loader):
+    """Cached results of several queries, see `check_cache`.
+
+    Args:
+        queries (dict): Cache keys by caller-side id, e.g. user id.
+        loader (callable): Called with the list of ids whose keys
+        missed, returns a dict of results by id.
+
+    Returns:
+        tuple: Results by id, missing ones as empty DataFrames,
+        and the elapsed time.
+    """
+    ids = {key: _id for _id, key in queries.items()}
+
+    def load(keys):
+        results = loader([ids[key] for key in keys])
+        return {queries[_id]: result for _id, result in results.items()}
+
+    start = time.time()
+    cached = inmemory_cache.get_many(list(ids), load)
+    elapsed_time = time.time() - start
+
+    results = {}
+    for _id, key in queries.items():
+        result = cached.get(key)
+        if result is None or result is NEGATIVE:
+            result = pd.DataFrame()
+        results[_id] = result
+    return results, elapsed_time
+
+
+def load_user(username):
+    user_data, tweets_df, _ = search_by_username(username)
+    if isinstance(user_data, str):
+        return NEGATIVE
+    return user_data, tweets_df
+
+
+def search_page(_key, size, cursor=None, backward=False):
+    """One page of Hashtag or Tweets results, see `Page`.
+
+    The indexes page through their results in memory. Before they
+    are built, the page is fetched from Couchbase with a keyset
+    condition and `LIMIT`, and the total is left to `count_matches`.
+    When a first page holds every result, later searches inside its
+    window, in any sort order, page through them in memory.
+    Query errors are raised, so they are not cached.
+
+    Returns:
+        Page: The page, `NEGATIVE` if the search has no results.
+    """
+    column, ascending = sort_options_cached[_key.sort]
+    if indexes_ready.is_set():
+        results = index_results(_key)
+        if column not in results.frame:
+            column, ascending = "created_at", False
+        page = page_frame(results, column, not ascending, size, cursor, backward)
+        return NEGATIVE if page.rows.empty and cursor is None else page
+
+    if column == "score":
+        # Only full-text results are scored, fall back to recency.
+        column, ascending = "created_at", False
+    results = fallback_results.get(_key._replace(sort=None))
+    if results is not None:
+        page = page_frame(results, column, not ascending, size, cursor, backward)
+        return NEGATIVE if page.rows.empty and cursor is None else page
+    sql_query = f"""
+    SELECT {TWEET_FIELDS}
+    FROM `{bucket_name}`.`{scope_name}`.`{collection_name}`
+    {match_condition(_key)}
+    {keyset_clause(column, not ascending, cursor, backward)}
+    ORDER BY {order_clause(column, not ascending, backward)}
+    LIMIT {size + 1};
+    """
+
+    df = read_frame(inventory_scope.query(sql_query))
+    if df.empty:
+        return NEGATIVE if cursor is None else Page(df, None, None, 0, True)
+    if _key.kind == "Tweets":
+        df["View Retweets"] = df["retweet_count"].apply(
+            lambda x: "View" if pd.notna(x) and x > 0 else ""
+        )
+    page = page_rows(df, column, size, cursor, backward)
+    if cursor is None and page.next is None:
+        # The first page holds every result: searches inside its
+        # window and other sort orders page through them in memory.
+        fallback_results.set(_key._replace(sort=None), SortedFrame(page.rows))
+    return page
+
+
+def find_page(_key, size, cursor=None, backward=False):
+    """Cached page of a Hashtag or Tweets search and its total.
+
+    Backend errors are raised and nothing is cached, searches
+    without results are cached briefly, see `check_cache`.
+
+    Returns:
+        tuple: The `Page`, empty if nothing matches, the total,
+        whether it is exact, and the elapsed time.
+    """
+    page, elapsed_time = check_cache(
+        (_key, size, cursor, backward),
+        lambda: search_page(_key, size, cursor, backward),
+        not_found=Page(pd.DataFrame(), None, None, 0, True),
+    )
+    total, exact = page.total, page.exact
+    if total is None:
+        (total, exact), _ = check_cache(
+            ("count", _key), lambda: count_matches(_key), not_found=(0, True)
+        )
+    return page, total, exact, elapsed_time
+
+
+def index_results(_key):
+    """All index results of a Hashtag or Tweets search, whatever
+    its sort order, see `SortedFrame`.
+
+    Pages of every sort order of a search share one entry, so
+    changing the order or the page reuses the sort orders already
+    computed instead of searching and sorting again. A search
+    inside the window of a cached one filters its results.
+    """
+
+    def load():
+        search = search_by_hashtag if _key.kind == "Hashtag" else search_by_text
+        df = search(
+            _key.term,
+            _key.start,
+            _key.end,
+            _key.sort,
+            bucket_name,
+            scope_name,
+            collection_name,
+        )[0]
+        return SortedFrame(df)
+
+    return results_cache.get(_key._replace(sort=None), load)
+
+
+def match_condition(_key):
+    """N1QL `WHERE` clause of a Hashtag or Tweets search."""
+    field = "hashtags" if _key.kind == "Hashtag" else "text"
+    # A trailing '*' asks the hashtag index for a prefix match,
+    # LIKE already matches substrings.
+    term = _key.term.rstrip("*")
+    start = _key.start.strftime("%Y-%m-%d %H:%M:%S+00:00")
+    end = _key.end.strftime("%Y-%m-%d %H:%M:%S+00:00")
+    return f"""WHERE tweets.{field} LIKE '%{term}%'
+    AND tweets.created_at BETWEEN '{start}' AND '{end}'"""
+
+
+def count_matches(_key, cap=COUNT_CAP):
+    """Number of matches of a search, counting at most `cap`.
+
+    Query errors are raised, so they are not cached.
+
+    Returns:
+        tuple: The count and whether it is exact, `NEGATIVE` if
+        there are no matches.
+    """
+    sql_query = f"""
+    SELECT RAW COUNT(*) FROM (
+        SELECT RAW 1
+        FROM `{bucket_name}`.`{scope_name}`.`{collection_name}`
+        {match_condition(_key)}
+        LIMIT {cap + 1}
+    ) AS matches;
+    """
+    count = next(iter(inventory_scope.query(sql_query)), 0)
+    if not count:
+        return NEGATIVE
+    return min(count, cap), count <= cap
+
+
+@functools.lru_cache(maxsize=None)
+def get_redis_cache():
+    """Redis cache shared by all sessions of this process."""
+    return RedisCache()
+
+
+redis_cache = get_redis_cache()
+
+
+def get_top_followed_users():
+    top_users = pg_pool.fetchall(TOP_FOLLOWED_USERS)
+    df_top_users = pd.DataFrame(
+        top_users, columns=["Name", "Screen Name", "Followers Count"]
+    )
+    return df_top_users
+
+
+def get_top_creator_locations():
+    result = pg_pool.fetchall(TOP_CREATOR_LOCATIONS)
+    df = pd.DataFrame(result, columns=["Location", "User Count"])
+    return df
+
+
+def get_top_hashtags():
+    # Counted by the query service, only the top 10 rows are returned.
+    hashtag_query = f"""
+    SELECT REPLACE(h, "']", "") AS Hashtag, COUNT(*) AS `Count`
+    FROM `{bucket_name}`.`{scope_name}`.`{collection_name}`
+    UNNEST SPLIT(SUBSTR(tweets.hashtags, 2, LENGTH(tweets.hashtags) - 2), "', '") AS h
+    WHERE tweets.hashtags IS NOT MISSING AND tweets.hashtags != '[]'
+    GROUP BY REPLACE(h, "']", "")
+    ORDER BY `Count` DESC
+    LIMIT 10
+    """
+
+    try:
+        top_hashtags = inventory_scope.query(hashtag_query)
+        return read_frame(top_hashtags, columns=["Hashtag", "Count"])
+
+    except Exception as e:
+        print("Error during database query:", e)
+        # Keep serving the previous counts.
+        raise
+
+
+def get_top_retweeted_tweets():
+    tweet_query = f"""
+    SELECT original_tweet_id, COUNT(*) as retweet_count
+    FROM `{bucket_name}`.`{scope_name}`.`{collection_name}`
+    WHERE is_retweet = 'True'
+    GROUP BY original_tweet_id
+    ORDER BY retweet_count DESC
+    LIMIT 10;
+    """
+    tweet_results = inventory_scope.query(tweet_query)
+    df_top_tweets = read_frame(tweet_results)
+    return df_top_tweets
+
+
+@functools.lru_cache(maxsize=None)
+def get_metrics_refresher():
+    """Recomputes the dashboard metrics in the background."""
+    refresher = RefreshAhead(get_redis_cache())
+    for key, loader in dashboard_loaders.items():
+        refresher.add(key, loader, METRICS_REFRESH_INTERVAL[key])
+    refresher.start()
+    return refresher
+
+
+def get_dashboard_metrics():
+    """Precomputed dashboard metrics, fetched in a single round trip.
+
+    Metrics are only computed by the background refresh. Missing
+    ones, e.g. on a cold start, are waited for briefly.
+
+    Returns:
+        dict: Metrics by name, None for those not computed yet.
+    """
+    metrics = dict(zip(dashboard_keys, redis_cache.get_many(dashboard_keys)))
+    missing = [key for key, metric in metrics.items() if metric is None]
+    if missing:
+        metrics_refresher.wait(missing, timeout=METRICS_WAIT_TIMEOUT)
+        metrics.update(zip(missing, redis_cache.get_many(missing)))
+    return metrics
+
+
+dashboard_loaders = {
+    "top_users": get_top_followed_users,
+    "top_locations": get_top_creator_locations,
+    "top_hashtags": get_top_hashtags,
+    "top_tweets": get_top_retweeted_tweets,
+}
+dashboard_keys = list(dashboard_loaders)
+metrics_refresher = get_metrics_refresher()
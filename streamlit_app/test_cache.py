@@ -0,0 +1,552 @@
+import pickle
+import threading
+import time
+
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import pandas as pd
+import pytest
+
+from cache import (
+    NEGATIVE,
+    ArrowCodec,
+    CacheStats,
+    JsonCodec,
+    LRUCache,
+    RangeCache,
+    RedisCache,
+    RefreshAhead,
+    SearchKey,
+    SingleFlight,
+    StripedCache,
+    TieredCache,
+    TinyLFUCache,
+    TTLCache,
+    sizeof,
+    to_prometheus,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_expiry():
+    clock = Clock()
+    cache = TTLCache(None, 10, _time=clock)
+    cache["a"] = 1
+    cache.set("b", 2, 30)
+    clock.now = 10
+    assert "a" not in cache
+    assert cache.get("b") == 2
+    clock.now = 30
+    with pytest.raises(KeyError):
+        cache["b"]
+
+
+def test_ttl_expires_at_most_max_expire_per_operation():
+    clock = Clock()
+    cache = TTLCache(None, 10, _time=clock, max_expire=4)
+    for i in range(20):
+        cache[i] = i
+    clock.now = 10
+    assert "missing" not in cache
+    assert len(cache._links) == 16
+    # len() expires with the same cap instead of sweeping.
+    assert len(cache) == 12
+    assert cache.sweep() == 12
+    assert len(cache) == 0
+
+
+def test_ttl_compacts_heap_in_bounded_steps():
+    clock = Clock()
+    cache = TTLCache(None, 100, _time=clock, max_expire=8)
+    for i in range(1000):
+        cache[i] = i
+    for step in range(1, 5000):
+        clock.now = step / 1000
+        stale = len(cache._stale)
+        cache[step % 1000] = step
+        # One write moves at most `max_expire` entries.
+        assert len(cache._stale) >= stale - 8
+        assert len(cache._heap) + len(cache._stale) <= 3 * 1000 + 64
+    assert cache.get(999) == 4999
+    clock.now = 200
+    cache.sweep()
+    assert len(cache) == 0
+    assert not cache._heap and not cache._stale
+
+
+def test_ttl_overwrite_with_same_expiry_expires():
+    clock = Clock()
+    cache = TTLCache(None, 10, _time=clock)
+    for _ in range(100):
+        cache["a"] = 1
+    assert len(cache._heap) == 1
+    clock.now = 10
+    assert cache.sweep() == 1
+    assert len(cache) == 0
+
+
+def test_lru_evicts_least_recently_used_by_weight():
+    evicted = []
+    cache = LRUCache(
+        None, callback=lambda k, v: evicted.append(k), max_weight=10, weigher=len
+    )
+    cache["a"] = "xxxx"
+    cache["b"] = "xxxx"
+    cache["a"]
+    cache["c"] = "xxxx"
+    assert evicted == ["b"]
+    assert cache.weight == 8
+
+    # A heavier value goes through eviction again.
+    cache["a"] = "x" * 8
+    assert list(cache) == ["a"]
+    assert cache.weight == 8
+    with pytest.raises(ValueError):
+        cache["d"] = "x" * 11
+    del cache["a"]
+    assert cache.weight == 0
+
+
+def test_ttl_cache_weight_budget():
+    cache = TTLCache(None, 10, max_weight=100, weigher=lambda v: v)
+    for i in range(10):
+        cache[i] = 30
+    assert len(cache) == 3
+    assert cache.weight == 90
+
+
+def test_sizeof():
+    small = pd.DataFrame({"text": ["a"] * 10})
+    large = pd.DataFrame({"text": ["a" * 1000] * 10})
+    assert sizeof(large) >= sizeof(small) + 9000
+    assert sizeof(("a" * 1000, {"k": large})) > sizeof(large) + 1000
+
+
+def test_striped_cache_splits_budgets():
+    cache = StripedCache(100, stripes=4, max_weight=400, weigher=lambda v: 1)
+    assert [stripe.capacity for stripe in cache._stripes] == [25] * 4
+    assert [stripe.max_weight for stripe in cache._stripes] == [100] * 4
+    for i in range(1000):
+        cache[i] = i
+    assert len(cache) <= 100
+    assert all(cache[k] == k for k in cache)
+
+
+def test_striped_cache_is_thread_safe():
+    cache = StripedCache(None, stripes=4, cache=TTLCache, ttl=60)
+
+    def work(offset):
+        for i in range(2000):
+            cache.set((offset, i % 100), i, 60)
+            cache.get((offset, (i * 7) % 100))
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(cache) == 800
+    assert cache.pop((0, 99)) == 1999
+    assert (0, 99) not in cache
+
+
+@pytest.fixture
+def redis_cache():
+    fakeredis = pytest.importorskip("fakeredis")
+    cache = RedisCache()
+    cache.redis = fakeredis.FakeStrictRedis()
+    return cache
+
+
+@pytest.fixture
+def tiered(redis_cache):
+    clock = Clock()
+    cache = TieredCache(
+        TTLCache(None, 100, _time=clock),
+        redis_cache,
+        l2_ttl=100,
+        negative_ttl=5,
+        _time=clock,
+    )
+    cache.clock = clock
+    return cache
+
+
+def test_tiered_reads_and_writes_through(tiered):
+    assert tiered.get("a", lambda: 1) == 1
+    assert tiered.l2.get("tiered:a") == 1
+    assert 0 < tiered.l2.redis.ttl("tiered:a") <= 100
+
+    # An L1 miss is answered by L2 and promoted.
+    tiered.l1.clear()
+    assert tiered.get("a", lambda: 2) == 1
+    assert "a" in tiered.l1
+    assert tiered.get("b") is None
+
+
+Point = namedtuple("Point", "x y")
+
+
+def test_arrow_codec_round_trip():
+    codec = ArrowCodec()
+    df = pd.DataFrame({"id": [2**40, 3], "text": ["a", None]}, index=[5, 7])
+    pd.testing.assert_frame_equal(codec.decode(codec.encode(df)), df)
+
+
+def test_json_codec_round_trip():
+    codec = JsonCodec(types=(SearchKey, Point))
+    df = pd.DataFrame(
+        {"id": [1, 2], "created_at": pd.to_datetime(["2020-04-01", "2020-04-02"])}
+    )
+    window = datetime(2020, 4, 1), datetime(2020, 4, 30)
+    key = SearchKey.make("Hashtag", "#covid", *window)
+    value = {
+        "frame": df,
+        "mixed": pd.DataFrame({"x": [1, "a"]}),
+        "key": key,
+        "point": Point(1.5, None),
+        "pair": (1, "a"),
+        "list": [True, "b"],
+        "when": datetime(2020, 1, 1, tzinfo=timezone.utc),
+        "stamp": pd.Timestamp("2020-01-01 00:00:00.000000001"),
+        "by_id": {1: "one", "$x": 2},
+    }
+    decoded = codec.decode(codec.encode(value))
+    pd.testing.assert_frame_equal(decoded.pop("frame"), df)
+    assert decoded.pop("mixed")["x"].tolist() == [1, "a"]
+    assert type(decoded["key"]) is SearchKey
+    assert type(decoded["point"]) is Point
+    value.pop("frame"), value.pop("mixed")
+    assert decoded == value
+
+
+def test_json_codec_decodes_unknown_types_as_tuples():
+    data = JsonCodec(types=(Point,)).encode(Point(1, 2))
+    decoded = JsonCodec().decode(data)
+    assert type(decoded) is tuple and decoded == (1, 2)
+    with pytest.raises(TypeError):
+        JsonCodec().encode(object())
+
+
+def test_redis_cache_round_trip():
+    cache = RedisCache(compress_threshold=0)
+    df = pd.DataFrame({"id": range(100), "text": ["tweet"] * 100})
+    assert cache.decode(cache.encode(NEGATIVE)) is NEGATIVE
+    pd.testing.assert_frame_equal(cache.decode(cache.encode(df)), df)
+    decoded = cache.decode(cache.encode(({"ID": 1}, df)))
+    assert decoded[0] == {"ID": 1}
+    pd.testing.assert_frame_equal(decoded[1], df)
+    assert cache.decode(None) is None
+
+
+def test_redis_cache_never_unpickles():
+    cache = RedisCache()
+    payload = b"\x00p-" + pickle.dumps({"ID": 1})
+    assert cache.decode(payload) is None
+
+
+def test_redis_cache_batches(redis_cache):
+    df = pd.DataFrame({"id": [1, 2]})
+    redis_cache.set_many({"a": df, "b": NEGATIVE, "c": "x"}, expire=30)
+    a, b, missing, c = redis_cache.get_many(["a", "b", "missing", "c"])
+    pd.testing.assert_frame_equal(a, df)
+    assert (b, missing, c) == (NEGATIVE, None, "x")
+    assert 0 < redis_cache.redis.ttl("c") <= 30
+    assert redis_cache.get_many([]) == []
+    assert redis_cache.stats.sets == 3
+    assert (redis_cache.stats.hits, redis_cache.stats.misses) == (3, 1)
+
+
+def test_tiered_get_many_loads_only_missing_keys(tiered):
+    tiered.set("a", 1)
+    loaded = []
+
+    def loader(keys):
+        loaded.append(list(keys))
+        return {key: key.upper() for key in keys}
+
+    assert tiered.get_many(["a", "b", "c"], loader) == {"a": 1, "b": "B", "c": "C"}
+    assert loaded == [["b", "c"]]
+    assert tiered.get_many(["b", "c"], loader) == {"b": "B", "c": "C"}
+    assert len(loaded) == 1
+
+
+def test_search_key_windows():
+    april = datetime(2020, 4, 1), datetime(2020, 4, 30)
+    key = SearchKey.make("Hashtag", " #covid  19 ", *april)
+    assert key.term == "covid 19"
+    narrower = key._replace(start=datetime(2020, 4, 10), end=datetime(2020, 4, 11))
+    assert key.scope == narrower.scope
+    assert key.covers(narrower) and not narrower.covers(key)
+    assert not key.covers(key._replace(start=None, end=None))
+    assert str(key) == "Hashtag|covid 19|2020-04-01T00:00:00|2020-04-30T00:00:00|"
+
+
+def test_range_cache_filters_wider_windows():
+    tweets = pd.DataFrame(
+        {
+            "id": [1, 2, 3],
+            "created_at": [
+                "2020-04-01 10:00:00+00:00",
+                "2020-04-10 10:00:00+00:00",
+                "2020-04-20 10:00:00+00:00",
+            ],
+        }
+    )
+    cache = RangeCache(LRUCache(None))
+    window = datetime(2020, 4, 1), datetime(2020, 4, 30)
+    april = SearchKey.make("Hashtag", "covid", *window)
+    loads = []
+    assert cache.get(april, lambda: loads.append(1) or tweets) is tweets
+
+    middle = april._replace(start=datetime(2020, 4, 5), end=datetime(2020, 4, 15))
+    assert cache.get(middle, lambda: loads.append(1))["id"].tolist() == [2]
+    assert loads == [1]
+    # Another term or sort order is another search.
+    assert cache.get(middle._replace(term="flu")) is None
+    assert cache.get(middle._replace(sort="Most Recent")) is None
+
+    # Forgotten once the wider window leaves the cache.
+    del cache.cache[april], cache.cache[middle]
+    assert cache.get(middle) is None and april not in cache._windows[april.scope]
+
+
+def test_range_cache_of_wrapped_results_over_budget():
+    class Results:
+        def __init__(self, frame):
+            self.frame = frame
+
+    cache = RangeCache(
+        LRUCache(None, max_weight=1, weigher=lambda results: len(results.frame)),
+        column="stamp",
+        rows=lambda results: results.frame,
+        wrap=Results,
+    )
+    key = SearchKey.make("Tweets", "a", datetime(2020, 1, 1), datetime(2020, 1, 31))
+    rows = pd.DataFrame({"stamp": pd.to_datetime(["2020-01-02", "2020-01-03"])})
+    # Larger than the budget: served, not cached.
+    assert cache.get(key, lambda: Results(rows)).frame is rows
+    assert cache.get(key) is None
+
+    cache.set(key, Results(rows.head(1)))
+    narrower = key._replace(end=datetime(2020, 1, 2, 12))
+    assert len(cache.get(narrower).frame) == 1
+
+
+def test_tinylfu_keeps_popular_items_through_a_scan():
+    cache = TinyLFUCache(100)
+    for _ in range(5):
+        for i in range(50):
+            cache[i] = i
+            cache[i]
+    for i in range(1000, 2000):
+        cache[i] = i
+    assert len(cache) == 100
+    assert sum(i in cache for i in range(50)) == 50
+
+
+def test_tinylfu_without_capacity():
+    with pytest.raises(ValueError):
+        TinyLFUCache(None, max_weight=1000)
+    cache = TinyLFUCache(None, max_weight=1000, weigher=lambda v: 10, item_weight=10)
+    for i in range(500):
+        cache[i] = i
+    assert len(cache) == 100
+    assert cache.weight == 1000
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return "value"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flights.do("k", slow)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    while not flights.in_flight("k"):
+        time.sleep(0.001)
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert results == ["value"] * 8
+    assert not flights.in_flight("k")
+
+
+def test_single_flight_shares_errors():
+    flights = SingleFlight()
+    with pytest.raises(KeyError):
+        flights.do("k", lambda: {}["missing"])
+    assert flights.do("k", lambda: 1) == 1
+
+
+def test_tiered_serves_stale_while_refreshing(redis_cache):
+    clock = Clock()
+    cache = TieredCache(
+        TTLCache(None, 100, _time=clock), redis_cache, fresh_ttl=10, _time=clock
+    )
+    assert cache.get("k", lambda: 1) == 1
+    clock.now = 20
+    refreshed = threading.Event()
+
+    def reload():
+        refreshed.set()
+        return 2
+
+    # The stale value is returned while it is reloaded in the background.
+    assert cache.get("k", reload) == 1
+    assert refreshed.wait(5)
+    deadline = time.monotonic() + 5
+    while cache.get("k") != 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.get("k") == 2
+
+
+def test_lru_order_lives_in_the_links():
+    cache = LRUCache(3)
+    for key in "abc":
+        cache[key] = key
+    cache["a"]
+    cache["d"] = "d"
+    assert sorted(cache) == ["a", "c", "d"]
+    assert "b" not in cache
+    assert [key for key, _ in cache.print_all()] == ["d", "a", "c"]
+    assert not hasattr(cache._links["a"], "__dict__")
+
+
+def test_stats_count_and_export():
+    cache = LRUCache(2)
+    cache["a"] = 1
+    cache["b"] = 2
+    cache["c"] = 3
+    cache.get("c")
+    cache.get("a")
+    stats = cache.stats.snapshot()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    assert (stats["sets"], stats["evictions"]) == (3, 1)
+    assert stats["hit_ratio"] == 0.5
+
+    merged = CacheStats.merge([cache.stats, cache.stats])
+    assert merged.hits == 2
+
+    text = to_prometheus({"search": cache})
+    assert 'cache_hits_total{cache="search"} 1' in text
+    assert 'cache_items{cache="search"} 2' in text
+    assert 'cache_latency_seconds_bucket{cache="search",op="get",le="+Inf"}' in text
+
+
+def test_stats_latency_histogram():
+    stats = CacheStats(sample=1)
+    for elapsed in (100, 1000, 10_000, 1_000_000):
+        stats.observe("get", elapsed)
+    histogram = stats.histogram("get")
+    assert histogram[-1][1] == 4
+    assert stats.quantile("get", 0.5) == 1024 / 1e9
+    assert stats.quantile("set", 0.5) == 0.0
+
+
+def test_tiered_counts_sets(tiered):
+    tiered.set("a", 1)
+    tiered.set_many({"b": 2, "c": 3})
+    tiered.get("d", lambda: 4)
+    assert tiered.stats.sets == 4
+
+
+def test_tiered_snapshot_round_trip(tiered, tmp_path):
+    key = SearchKey.make("Tweets", "covid", datetime(2020, 4, 1), datetime(2020, 4, 2))
+    df = pd.DataFrame({"id": [1, 2]})
+    tiered.set((key, 20), df)
+    tiered.set(("count", key), (2, True))
+    path = str(tmp_path / "snapshot.arrow")
+    assert tiered.save(path) == 2
+    assert [p.name for p in tmp_path.iterdir()] == ["snapshot.arrow"]
+
+    restored = TieredCache(TTLCache(None, 100), tiered.l2)
+    tiered.l2.redis.flushall()
+    assert restored.restore(path) == 2
+    assert restored.get(("count", key)) == (2, True)
+    pd.testing.assert_frame_equal(restored.get((key, 20)), df)
+
+
+def test_tiered_caches_negative_results(tiered):
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return NEGATIVE
+
+    assert tiered.get("missing", loader) is NEGATIVE
+    assert tiered.get("missing", loader) is NEGATIVE
+    assert len(calls) == 1
+    assert tiered.stats.negative_hits == 1
+    assert 0 < tiered.l2.redis.ttl("tiered:missing") <= 5
+
+    # Gone from L1 after negative_ttl, still in L2 until it expires there.
+    tiered.clock.now = 5
+    assert "missing" not in tiered.l1
+    tiered.l2.delete("tiered:missing")
+    assert tiered.get("missing", loader) is NEGATIVE
+    assert len(calls) == 2
+
+
+def test_tiered_does_not_cache_errors(tiered):
+    def failing():
+        raise RuntimeError("backend down")
+
+    with pytest.raises(RuntimeError):
+        tiered.get("key", failing)
+    assert tiered.get("key", lambda: 1) == 1
+    assert tiered.get("key") == 1
+
+
+def test_refresh_ahead_stores_with_ttl(redis_cache):
+    refresher = RefreshAhead(redis_cache)
+    values = iter(range(10))
+    refresher.add("metric", lambda: next(values), interval=60)
+    assert not refresher.wait(timeout=0)
+    assert refresher.refresh("metric")
+    assert redis_cache.get("metric") == 0
+    assert 0 < redis_cache.redis.ttl("metric") <= 180
+    assert refresher.wait(timeout=0)
+
+    # Another process holds the lease: the stored value stays.
+    assert refresher.refresh("metric")
+    assert redis_cache.get("metric") == 0
+
+
+def test_refresh_ahead_runs_in_background(redis_cache):
+    refresher = RefreshAhead(redis_cache)
+    refresher.add("metric", lambda: "value", interval=60)
+    refresher.start()
+    try:
+        assert refresher.wait(timeout=5)
+        assert redis_cache.get("metric") == "value"
+    finally:
+        refresher.stop()
+
+
+def test_refresh_ahead_keeps_value_on_errors(redis_cache):
+    refresher = RefreshAhead(redis_cache)
+    refresher.add("metric", lambda: 1 / 0, interval=60)
+    with pytest.raises(ZeroDivisionError):
+        refresher.refresh("metric")
+    # The lease is released for the next attempt.
+    assert not redis_cache.redis.exists("refresh-lease:metric")
@@ -0,0 +1,171 @@
+import threading
+
+import psycopg2
+import psycopg2.pool
+import pytest
+
+from db import PoolTimeout, PostgresPool, Statement
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.connection = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, sql, params=None):
+        if self.connection.broken:
+            raise psycopg2.OperationalError("server closed the connection")
+        self.connection.executed.append(sql)
+
+    def fetchall(self):
+        return [(1,)]
+
+    def fetchone(self):
+        return (1,)
+
+
+class FakeConnection:
+    def __init__(self, dsn):
+        self.dsn = dsn
+        self.prepared = set()
+        self.executed = []
+        self.broken = False
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def opened():
+    return []
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def pool(opened, clock):
+    def connect(connection_factory, **dsn):
+        conn = FakeConnection(dsn)
+        opened.append(conn)
+        return conn
+
+    return PostgresPool(
+        maxconn=2,
+        timeout=0.05,
+        check_after=30,
+        _connect=connect,
+        _time=clock,
+        host="db",
+        connect_timeout=3,
+    )
+
+
+STATEMENT = Statement("user_by_id", "SELECT * FROM users WHERE id = $1", ["bigint"])
+
+
+def test_connections_are_reused_and_autocommit(pool, opened):
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert first is second and len(opened) == 1
+    assert first.autocommit
+    assert first.dsn == {"host": "db", "connect_timeout": 3}
+
+
+def test_waits_at_most_timeout(pool):
+    with pool.connection(), pool.connection():
+        with pytest.raises(PoolTimeout):
+            with pool.connection():
+                pass
+    # Slots are given back, including after the timeout.
+    with pool.connection(), pool.connection():
+        pass
+
+
+def test_released_connection_wakes_a_waiter(pool):
+    pool.timeout = 5
+    acquired = threading.Event()
+
+    def wait():
+        with pool.connection():
+            acquired.set()
+
+    with pool.connection(), pool.connection():
+        waiter = threading.Thread(target=wait)
+        waiter.start()
+        assert not acquired.wait(0.05)
+    waiter.join(5)
+    assert acquired.is_set()
+
+
+def test_broken_connections_are_discarded(pool, opened):
+    with pytest.raises(psycopg2.OperationalError):
+        with pool.connection() as conn:
+            conn.broken = True
+            pool._execute(conn.cursor(), STATEMENT, (1,))
+    assert conn.closed
+    with pool.connection() as other:
+        assert other is not conn
+    assert len(opened) == 2
+
+
+def test_idle_connections_are_checked(pool, opened, clock):
+    with pool.connection() as conn:
+        pass
+    clock.now = 10
+    with pool.connection() as again:
+        assert again is conn and conn.executed == []
+
+    # Idle for longer than check_after: checked, and replaced if dead.
+    clock.now = 100
+    with pool.connection() as again:
+        assert again is conn and conn.executed == ["SELECT 1"]
+    clock.now = 200
+    conn.broken = True
+    with pool.connection() as other:
+        assert other is not conn
+    assert conn.closed and len(opened) == 2
+
+
+def test_statements_are_prepared_once_per_connection(pool, opened):
+    assert pool.fetchone(STATEMENT, (1,)) == (1,)
+    assert pool.fetchall(STATEMENT, (2,)) == [(1,)]
+    conn = opened[0]
+    assert conn.executed == [
+        "PREPARE user_by_id (bigint) AS SELECT * FROM users WHERE id = $1",
+        "EXECUTE user_by_id (%s)",
+        "EXECUTE user_by_id (%s)",
+    ]
+    with pool.connection(), pool.connection() as other:
+        pool._execute(other.cursor(), STATEMENT, (3,))
+    assert other.executed[0].startswith("PREPARE user_by_id")
+
+
+def test_closed_pool(pool, opened):
+    with pool.connection() as borrowed:
+        pool.close()
+    assert borrowed.closed
+    with pytest.raises(psycopg2.pool.PoolError):
+        with pool.connection():
+            pass
@@ -0,0 +1,214 @@
+import random
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from index import HashtagIndex, RowStore, SegmentedIndex, TextIndex, UserIndex
+
+WINDOWS = [
+    (None, None),
+    (datetime(2020, 4, 1), datetime(2020, 4, 30, 23, 59)),
+    (datetime(2020, 4, 10, 6), datetime(2020, 4, 10, 18)),
+    (datetime(2021, 1, 1), datetime(2021, 2, 1)),
+]
+
+
+@pytest.fixture(scope="module")
+def tweets():
+    rng = random.Random(0)
+    words = [f"w{i}" for i in range(50)]
+    base = pd.Timestamp("2020-03-20", tz="UTC")
+    created = [
+        (base + pd.Timedelta(seconds=rng.randrange(40 * 86400))).strftime(
+            "%Y-%m-%d %H:%M:%S+00:00"
+        )
+        for _ in range(3000)
+    ]
+    df = pd.DataFrame(
+        {
+            "id": np.arange(3000),
+            "created_at": created,
+            "text": [" ".join(rng.choices(words, k=8)) for _ in range(3000)],
+            "hashtags": [
+                str([f"tag{rng.randrange(10)}"]) if i % 5 else "[]"
+                for i in range(3000)
+            ],
+        }
+    )
+    df.loc[7, "created_at"] = None
+    return df
+
+
+def test_text_index_ranks_with_bm25():
+    index = TextIndex()
+    index.add(
+        pd.DataFrame(
+            {
+                "id": [1, 2, 3, 4],
+                "created_at": [
+                    "2020-04-01 10:00:00+00:00",
+                    "2020-04-02 10:00:00+00:00",
+                    "2020-04-03 10:00:00+00:00",
+                    "2020-04-04 10:00:00+00:00",
+                ],
+                "text": [
+                    "covid news from the city",
+                    "Covid covid COVID",
+                    "stay home, stay safe",
+                    "new covid-19 cases at home",
+                ],
+            }
+        )
+    )
+    assert index.search("covid")["id"].tolist() == [2, 1, 4]
+    assert index.search('"stay safe"')["id"].tolist() == [3]
+    assert index.search('"safe stay"').empty
+    assert index.search("covid-19")["id"].tolist() == [4]
+    assert sorted(index.search("city OR safe")["id"]) == [1, 3]
+    assert index.search("covid home")["id"].tolist() == [4]
+    window = (datetime(2020, 4, 2), datetime(2020, 4, 3, 23))
+    assert index.search("covid", *window)["id"].tolist() == [2]
+    assert index.search("covid", limit=1)["id"].tolist() == [2]
+
+    # Rows with known ids are skipped.
+    assert index.add(index.docs.head(2)) == 0
+    index.compact()
+    assert index.search("covid")["id"].tolist() == [2, 1, 4]
+    with pytest.raises(ValueError):
+        index.add(index.docs.head(1).assign(id=5))
+
+
+def test_compacted_text_index_keeps_decoded_postings():
+    index = TextIndex(cached_terms=2)
+    index.add(
+        pd.DataFrame(
+            {
+                "id": [1, 2, 3],
+                "created_at": ["2020-04-01 10:00:00+00:00"] * 3,
+                "text": ["stay home, stay safe", "safe at home", "home home"],
+            }
+        )
+    )
+    assert index.postings("home") == {0: [1], 1: [2], 2: [0, 1]}
+    growing = index.search('"stay safe" OR home')
+    assert not index._decoded
+
+    index.compact()
+    pd.testing.assert_frame_equal(index.search('"stay safe" OR home'), growing)
+    assert len(index._decoded) == 2
+    index.search("at")
+    decoded = index._decoded["at"]
+    index.search("at home")
+    assert index._decoded["at"] is decoded
+    assert set(index._decoded) == {"at", "home"}
+
+
+def test_hashtag_index_exact_and_prefix(tweets):
+    index = HashtagIndex()
+    index.add(tweets)
+    assert len(index) == (tweets["hashtags"] != "[]").sum()
+
+    found = index.search("#TAG1")
+    expected = tweets[tweets["hashtags"] == "['tag1']"]
+    assert sorted(found["id"]) == sorted(expected["id"])
+    stamps = found["created_at"].dropna().tolist()
+    assert stamps == sorted(stamps)
+
+    assert len(index.search("tag", prefix=True)) == len(index)
+    assert index.search("tag").empty
+    window = index.search("tag1", datetime(2020, 4, 1), datetime(2020, 4, 2))
+    assert window["created_at"].between("2020-04-01", "2020-04-02").all()
+    assert len(index.search("tag1", limit=3)) == 3
+
+
+def test_segmented_indexes_share_rows(tweets):
+    store = RowStore()
+    text = SegmentedIndex(TextIndex, store=store)
+    hashtags = SegmentedIndex(HashtagIndex, store=store)
+    for begin in range(0, len(tweets), 1000):
+        rows, start = store.add(tweets.iloc[begin : begin + 1000])
+        assert text.add(rows, start) == hashtags.add(rows, start) == len(rows)
+    assert store.add(tweets.head(10))[0].empty
+    assert len(store) == len(text) == len(hashtags) == len(tweets)
+
+    flat = HashtagIndex()
+    flat.add(tweets)
+    found = hashtags.search("tag3")
+    assert sorted(found["id"]) == sorted(flat.search("tag3")["id"])
+    assert list(found.columns) == list(tweets.columns)
+    assert text.search("w1")["id"].isin(tweets["id"]).all()
+
+    # Segments keep ids, timestamps and positions, and only the
+    # rows they index.
+    for segment in hashtags.segments:
+        assert list(segment.index.docs.columns) == ["id", "created_at", "_row"]
+    assert sum(len(s.index.docs) for s in hashtags.segments) == len(flat)
+
+
+def test_user_index_resolves_best_match_first():
+    index = UserIndex()
+    index.add(
+        pd.DataFrame(
+            {
+                "id": [1, 2, 3],
+                "name": ["Alice", "alice", "Alicia Keys"],
+                "screen_name": ["al", "alice_2", "keys"],
+            }
+        )
+    )
+    assert index.resolve("alice") == [2, 1]
+    assert index.resolve("ali") == [1, 2, 3]
+    assert index.resolve("Alice", prefix=False) == [1, 2]
+    assert index.resolve("alicia", limit=2) == [3]
+    assert index.resolve("nobody") == []
+
+
+def build(factory, df):
+    flat, segmented = factory(), SegmentedIndex(factory)
+    for start in range(0, len(df), 500):
+        flat.add(df.iloc[start : start + 500])
+        segmented.add(df.iloc[start : start + 500])
+    segmented.seal()
+    return flat, segmented
+
+
+@pytest.fixture(scope="module")
+def text_indexes(tweets):
+    return build(TextIndex, tweets)
+
+
+@pytest.fixture(scope="module")
+def hashtag_indexes(tweets):
+    return build(HashtagIndex, tweets)
+
+
+@pytest.mark.parametrize("window", WINDOWS)
+def test_segmented_text_index_matches_flat(tweets, text_indexes, window):
+    flat, segmented = text_indexes
+    assert len(segmented) == len(tweets)
+    for query in ["w1", "w1 w2", '"w3 w4"', "w5 OR w6", "nothing"]:
+        expected, got = flat.search(query, *window), segmented.search(query, *window)
+        assert list(got.columns) == list(expected.columns)
+        assert sorted(got["id"]) == sorted(expected["id"])
+        np.testing.assert_allclose(
+            np.sort(got["score"].to_numpy()), np.sort(expected["score"].to_numpy())
+        )
+
+
+@pytest.mark.parametrize("window", WINDOWS)
+def test_segmented_hashtag_index_matches_flat(hashtag_indexes, window):
+    flat, segmented = hashtag_indexes
+    for tag, prefix in [("tag1", False), ("tag", True), ("#TAG2", False)]:
+        expected = flat.search(tag, *window, prefix=prefix)
+        got = segmented.search(tag, *window, prefix=prefix)
+        assert sorted(got["id"]) == sorted(expected["id"])
+
+
+def test_sealed_segments_take_no_rows(tweets):
+    _, segmented = build(HashtagIndex, tweets)
+    segments = len(segmented.segments)
+    segmented.add(tweets.iloc[11:12].assign(id=-1))
+    assert len(segmented.segments) == segments + 1
+    assert -1 in segmented.search("tag", prefix=True)["id"].tolist()
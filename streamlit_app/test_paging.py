@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from paging import (
+    Cursor,
+    SortedFrame,
+    keyset_clause,
+    order_clause,
+    page_frame,
+    page_rows,
+)
+
+
+def expected_order(df, column, descending):
+    """Rows with a value by `(column, id)`, then the others by id."""
+    valued = df[df[column].notna()]
+    valued = valued.sort_values([column, "id"], ascending=not descending)
+    nulls = df[df[column].isna()].sort_values("id", ascending=not descending)
+    return valued["id"].tolist() + nulls["id"].tolist()
+
+
+def frames():
+    rng = np.random.RandomState(0)
+    ids = rng.permutation(200)
+    counts = rng.randint(0, 10, 200).astype(float)
+    counts[rng.rand(200) < 0.2] = np.nan
+    texts = pd.Series([f"t{i % 7}" for i in range(200)], dtype=object)
+    texts[rng.rand(200) < 0.2] = None
+    yield pd.DataFrame({"id": ids, "key": counts})
+    yield pd.DataFrame({"id": ids, "key": texts})
+    yield pd.DataFrame({"id": ids, "key": np.nan})
+
+
+def all_pages(df, descending, size):
+    pages, cursor = [], None
+    while True:
+        page = page_frame(df, "key", descending, size, cursor)
+        pages.append(page)
+        if page.next is None:
+            return pages
+        cursor = page.next
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("size", [1, 7, 50])
+def test_pages_forward_and_backward_with_null_keys(descending, size):
+    for df in frames():
+        pages = all_pages(df, descending, size)
+        ids = [i for page in pages for i in page.rows["id"]]
+        assert ids == expected_order(df, "key", descending)
+        assert all(page.total == len(df) and page.exact for page in pages)
+
+        # Back from the last page to the first.
+        page, back = pages[-1], []
+        while page.prev is not None:
+            page = page_frame(df, "key", descending, size, page.prev, True)
+            back.append(page.rows["id"].tolist())
+        assert back == [p.rows["id"].tolist() for p in pages[-2::-1]]
+
+
+def test_cursor_of_null_key_has_no_value():
+    df = pd.DataFrame({"id": [1, 2, 3], "key": [1.0, np.nan, np.nan]})
+    page = page_frame(df, "key", False, 2)
+    assert page.next == Cursor(None, 2)
+    page = page_frame(df, "key", False, 2, page.next)
+    assert page.rows["id"].tolist() == [3]
+
+
+def test_empty_frame():
+    page = page_frame(pd.DataFrame({"id": [], "key": []}), "key", False, 10)
+    assert page.rows.empty and page.total == 0 and page.next is None
+
+
+def test_page_rows_of_a_query():
+    rows = pd.DataFrame({"id": [9, 8, 7], "key": [3, 2, 1]})
+    page = page_rows(rows, "key", 2)
+    assert page.rows["id"].tolist() == [9, 8]
+    assert page.next == Cursor(2, 8) and page.prev is None
+    # Fetched backward, in reverse order: more rows before.
+    rows = pd.DataFrame({"id": [7, 8, 9], "key": [1, 2, 3]})
+    page = page_rows(rows, "key", 2, Cursor(0, 6), backward=True)
+    assert page.rows["id"].tolist() == [8, 7]
+    assert page.prev == Cursor(2, 8) and page.next == Cursor(1, 7)
+
+
+def test_keyset_clause():
+    assert keyset_clause("created_at", True, None) == ""
+    clause = keyset_clause("retweet_count", True, Cursor(5, 10))
+    assert clause == (
+        "AND (tweets.retweet_count < 5 OR "
+        "(tweets.retweet_count = 5 AND tweets.id < 10) OR "
+        "tweets.retweet_count IS NOT VALUED)"
+    )
+    assert keyset_clause("retweet_count", True, Cursor(5, 10), True) == (
+        "AND (tweets.retweet_count > 5 OR "
+        "(tweets.retweet_count = 5 AND tweets.id > 10))"
+    )
+    assert keyset_clause("reply_count", False, Cursor(None, 10)) == (
+        "AND (tweets.reply_count IS NOT VALUED AND tweets.id > 10)"
+    )
+    assert keyset_clause("reply_count", False, Cursor(None, 10), True) == (
+        "AND (tweets.reply_count IS VALUED OR "
+        "(tweets.reply_count IS NOT VALUED AND tweets.id < 10))"
+    )
+    assert order_clause("retweet_count", True) == (
+        "tweets.retweet_count DESC NULLS LAST, tweets.id DESC"
+    )
+    assert order_clause("retweet_count", True, True) == (
+        "tweets.retweet_count ASC NULLS FIRST, tweets.id ASC"
+    )
+
+
+class Valued:
+    """Value compared as N1QL compares it: NULL compares as unknown."""
+
+    def __init__(self, value):
+        self.value = None if pd.isna(value) else value
+
+    def __eq__(self, other):
+        return self.value is not None and self.value == other
+
+    def __lt__(self, other):
+        return self.value is not None and self.value < other
+
+    def __gt__(self, other):
+        return self.value is not None and self.value > other
+
+
+def query_page(df, descending, size, cursor=None, backward=False):
+    """Page of `df` fetched the way a Couchbase search fetches it."""
+    clause = keyset_clause("key", descending, cursor, backward, alias="t")
+    order = order_clause("key", descending, backward, alias="t")
+    condition = (
+        clause[len("AND ") :]
+        .replace("t.key IS NOT VALUED", "key.value is None")
+        .replace("t.key IS VALUED", "key.value is not None")
+        .replace(" = ", " == ")
+        .replace(" AND ", " and ")
+        .replace(" OR ", " or ")
+        .replace("t.key", "key")
+        .replace("t.id", "id_")
+    )
+    rows = [
+        row
+        for row in df.itertuples(index=False)
+        if not condition or eval(condition, {"key": Valued(row.key), "id_": row.id})
+    ]
+    reverse = " DESC " in order
+    valued = sorted(
+        (row for row in rows if not pd.isna(row.key)),
+        key=lambda row: (row.key, row.id),
+        reverse=reverse,
+    )
+    nulls = sorted(
+        (row for row in rows if pd.isna(row.key)),
+        key=lambda row: row.id,
+        reverse=reverse,
+    )
+    rows = nulls + valued if "NULLS FIRST" in order else valued + nulls
+    fetched = pd.DataFrame(rows[: size + 1], columns=df.columns)
+    return page_rows(fetched, "key", size, cursor, backward)
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_query_pages_match_in_memory_pages(descending):
+    for df in frames():
+        page = query_page(df, descending, 15)
+        pages = [page]
+        while page.next is not None:
+            page = query_page(df, descending, 15, page.next)
+            pages.append(page)
+        expected = all_pages(df, descending, 15)
+        assert [p.rows["id"].tolist() for p in pages] == [
+            p.rows["id"].tolist() for p in expected
+        ]
+        assert pages[-1].next is None
+
+        page, back = pages[-1], []
+        while page.prev is not None:
+            page = query_page(df, descending, 15, page.prev, True)
+            back.append(page.rows["id"].tolist())
+        assert back == [p.rows["id"].tolist() for p in pages[-2::-1]]
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_sorted_frame_top_matches_full_order(descending):
+    for df in frames():
+        sorted_frame = SortedFrame(df)
+        for n in (1, 5, 150, 500):
+            top = sorted_frame.top("key", descending, n)
+            assert df["id"].to_numpy()[top].tolist() == (
+                expected_order(df, "key", descending)[:n]
+            )
+
+
+def test_sorted_frame_memoizes_orders():
+    df = next(frames())
+    sorted_frame = SortedFrame(df)
+    first = page_frame(sorted_frame, "key", True, 10)
+    ascending = sorted_frame.order("key", False)
+    # One order serves both directions.
+    assert sorted_frame._orders["key"] is not None
+    assert page_frame(sorted_frame, "key", True, 10).rows.equals(first.rows)
+    descending = sorted_frame.order("key", True)
+    valued = len(df) - df["key"].isna().sum()
+    assert (descending[:valued] == ascending[:valued][::-1]).all()
+    pages = all_pages(sorted_frame, True, 30)
+    assert [i for p in pages for i in p.rows["id"]] == expected_order(df, "key", True)
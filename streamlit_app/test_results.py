@@ -0,0 +1,88 @@
+import pandas as pd
+
+from results import iter_frames, read_frame, split_frame
+
+
+class FakeCursor:
+    """DB-API cursor over a list of rows."""
+
+    def __init__(self, rows, names):
+        self.description = [(name,) + (None,) * 6 for name in names]
+        self._rows = list(rows)
+        self.fetches = 0
+
+    def fetchmany(self, size):
+        self.fetches += 1
+        chunk, self._rows = self._rows[:size], self._rows[size:]
+        return chunk
+
+
+def test_read_frame_of_documents_missing_fields():
+    docs = [{"id": i, "text": f"t{i}"} for i in range(10)]
+    docs[7]["retweet_count"] = 3
+    df = read_frame(iter(docs), size=4)
+    assert list(df.columns) == ["id", "text", "retweet_count"]
+    assert df["id"].tolist() == list(range(10))
+    assert df["retweet_count"].isna().sum() == 9
+
+
+def test_read_frame_fetches_cursor_in_chunks():
+    cursor = FakeCursor([(i, f"u{i}") for i in range(10)], ["id", "name"])
+    df = read_frame(cursor, size=3)
+    assert cursor.fetches == 5
+    assert df["name"].tolist() == [f"u{i}" for i in range(10)]
+
+
+def test_read_frame_keeps_mixed_columns():
+    docs = [{"id": 1, "value": 1}, {"id": 2, "value": "two"}]
+    assert read_frame(docs)["value"].tolist() == [1, "two"]
+    # Typed differently across chunks.
+    assert read_frame(docs, size=1)["value"].tolist() == [1, "two"]
+
+
+def test_read_frame_of_no_rows():
+    df = read_frame([], columns=["id", "text"])
+    assert df.empty and list(df.columns) == ["id", "text"]
+
+
+def test_iter_frames():
+    frames = list(iter_frames([(i, i * 2) for i in range(5)], 2, ["a", "b"]))
+    assert [len(df) for df in frames] == [2, 2, 1]
+    assert pd.concat(frames)["b"].tolist() == [0, 2, 4, 6, 8]
+
+
+def test_read_frame_keeps_large_ids_with_nulls():
+    docs = [
+        {"id": 1250000000000000003, "original_tweet_id": None},
+        {"id": 1250000000000000005, "original_tweet_id": 1250000000000000003},
+    ]
+    for df in (read_frame(docs), read_frame(docs, size=1)):
+        assert df["id"].dtype == "int64"
+        assert df["original_tweet_id"].dtype == "Int64"
+        assert df["original_tweet_id"].isna().tolist() == [True, False]
+        assert int(df["original_tweet_id"][1]) == 1250000000000000003
+    frames = list(iter_frames(docs))
+    assert frames[0]["original_tweet_id"].dtype == "Int64"
+
+
+def test_split_frame_by_column():
+    tweets = pd.DataFrame({"user_id": [2, 1, 2, 2], "text": ["a", "b", "c", "d"]})
+    timelines = split_frame(tweets, "user_id", [1, 2, 3], missing="none")
+    assert list(timelines) == [1, 2, 3]
+    assert timelines[1]["text"].tolist() == ["b"]
+    assert timelines[2]["text"].tolist() == ["a", "c", "d"]
+    assert timelines[2].index.tolist() == [0, 1, 2]
+    assert timelines[3] == "none"
+
+
+def test_split_frame_by_keys():
+    retweets = pd.DataFrame({"original_tweet_id": [5, 5, 6], "user_id": [1, 2, 3]})
+    by_tweet = split_frame(
+        retweets.drop(columns="original_tweet_id"),
+        retweets["original_tweet_id"],
+        [6, 5],
+    )
+    assert list(by_tweet) == [6, 5]
+    assert by_tweet[5].columns.tolist() == ["user_id"]
+    assert by_tweet[5]["user_id"].tolist() == [1, 2]
+    assert by_tweet[6]["user_id"].tolist() == [3]